@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        if settings.MAINTENANCE_INTERVAL:
+            from .maintenance import start_scheduler
+            request_started.connect(
+                start_scheduler, dispatch_uid='core.maintenance'
+            )
@@ -0,0 +1,57 @@
+from django.core.cache.backends import locmem
+
+from core import metrics
+from core.backends import shm
+
+_MISSING = object()
+
+
+class TimedCacheMixin:
+    """Засчитывает время обращений к кэшу в метрики запроса
+    и считает попадания и промахи."""
+
+    def get(self, key, default=None, version=None):
+        with metrics.timed('cache') as outer:
+            value = super().get(key, _MISSING, version)
+        if outer:
+            hit = value is not _MISSING
+            metrics.registry.cache_lookup(hit, not hit)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        with metrics.timed('cache') as outer:
+            values = super().get_many(keys, version)
+        if outer:
+            metrics.registry.cache_lookup(
+                len(values), len(keys) - len(values)
+            )
+        return values
+
+    def set(self, *args, **kwargs):
+        with metrics.timed('cache'):
+            return super().set(*args, **kwargs)
+
+    def add(self, *args, **kwargs):
+        with metrics.timed('cache'):
+            return super().add(*args, **kwargs)
+
+    def set_many(self, *args, **kwargs):
+        with metrics.timed('cache'):
+            return super().set_many(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with metrics.timed('cache'):
+            return super().delete(*args, **kwargs)
+
+    def incr(self, *args, **kwargs):
+        with metrics.timed('cache'):
+            return super().incr(*args, **kwargs)
+
+
+class LocMemCache(TimedCacheMixin, locmem.LocMemCache):
+    pass
+
+
+class SharedMemoryCache(TimedCacheMixin, shm.SharedMemoryCache):
+    pass
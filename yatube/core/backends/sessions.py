@@ -0,0 +1,13 @@
+from django.contrib.sessions.backends import db
+
+from core.writer import write
+
+
+class SessionStore(db.SessionStore):
+    """Сессии в БД, записи идут через поток-писатель."""
+
+    def save(self, must_create=False):
+        write(super().save, must_create)
+
+    def delete(self, session_key=None):
+        write(super().delete, session_key)
@@ -0,0 +1,321 @@
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: кэш общий только для потоков процесса.
+    fcntl = None
+
+# Метка формата: меняйте ее при любом изменении заголовков или
+# кодирования значений, тогда файл старого формата создается заново.
+MAGIC = b'YTSHM002'
+# Заголовок файла: метка, размер ячейки, ячеек в наборе, наборов.
+HEADER = struct.Struct('<8sIII')
+HEADER_SIZE = 4096
+# Заголовок ячейки: хэш ключа (0 — ячейка пуста), срок годности
+# (0 — бессрочно), время последнего обращения, длины ключа и значения,
+# флаги.
+ENTRY = struct.Struct('<QdQIIB3x')
+COMPRESSED = 1
+# Значения короче не сжимаются: zlib им почти ничего не дает.
+COMPRESS_MIN = 1024
+# Блокировки потоков одного процесса: наборы делят их по модулю.
+STRIPES = 64
+
+
+class Table:
+    """Хэш-таблица фиксированного размера в файле, отображенном в память.
+
+    Файл поделен на sets наборов по ways ячеек размером slot_size байт;
+    ключ живет в одной ячейке своего набора. Когда свободных ячеек
+    в наборе нет, вытесняется та, к которой дольше всего не обращались.
+    Набор на время операции блокируется двумя замками: threading.Lock
+    для потоков своего процесса и fcntl-блокировкой байта файла
+    для остальных процессов.
+
+    fcntl-блокировки принадлежат процессу и снимаются, когда процесс
+    закрывает любой дескриптор файла, поэтому файл открывается
+    один раз на процесс — через get_table. Если геометрия в настройках
+    изменилась, файл создается заново: перезапускайте все процессы
+    вместе.
+    """
+
+    def __init__(self, path, size, slot_size, ways):
+        if slot_size <= ENTRY.size:
+            raise ValueError(f'Ячейка меньше заголовка: {slot_size}')
+        self.slot_size = slot_size
+        self.ways = ways
+        self.sets = max(size // (slot_size * ways), 1)
+        self.set_size = slot_size * ways
+        length = HEADER_SIZE + self.sets * self.set_size
+        self.stripes = [threading.Lock() for _ in range(STRIPES)]
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        header = HEADER.pack(MAGIC, slot_size, ways, self.sets)
+        with self._file_lock():
+            if (os.fstat(self.fd).st_size != length
+                    or os.pread(self.fd, HEADER.size, 0) != header):
+                os.ftruncate(self.fd, 0)
+                os.ftruncate(self.fd, length)
+                os.pwrite(self.fd, header, 0)
+        self.map = mmap.mmap(self.fd, length)
+
+    @contextmanager
+    def _file_lock(self, start=0, length=0):
+        """fcntl-блокировка байтов файла; length = 0 — до конца файла."""
+        if fcntl is None:
+            yield
+            return
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, length, start)
+        try:
+            yield
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, length, start)
+
+    @contextmanager
+    def _locked(self, number):
+        with self.stripes[number % STRIPES], self._file_lock(number, 1):
+            yield
+
+    def _place(self, key):
+        """Хэш ключа (не ноль) и номер его набора."""
+        digest = hashlib.blake2b(key, digest_size=8).digest()
+        digest = int.from_bytes(digest, 'little') | 1
+        return digest, (digest >> 1) % self.sets
+
+    def _find(self, number, digest, key):
+        """Ячейка с ключом и ячейка, куда его можно записать.
+
+        Пустые и просроченные ячейки занимаются в первую очередь,
+        иначе — та, к которой дольше всего не обращались.
+        """
+        now = time.time()
+        free = oldest = None
+        oldest_used = None
+        base = HEADER_SIZE + number * self.set_size
+        for offset in range(base, base + self.set_size, self.slot_size):
+            stored, expires, used, key_size, _, _ = ENTRY.unpack_from(
+                self.map, offset
+            )
+            if not stored:
+                free = free or offset
+                continue
+            start = offset + ENTRY.size
+            if (stored == digest
+                    and self.map[start:start + key_size] == key):
+                return offset, offset
+            if expires and expires <= now:
+                free = free or offset
+            elif oldest_used is None or used < oldest_used:
+                oldest, oldest_used = offset, used
+        return None, free or oldest
+
+    def _read(self, offset, touch=True):
+        """(флаги, данные, срок) живой ячейки; просроченная очищается."""
+        _, expires, _, key_size, size, flags = ENTRY.unpack_from(
+            self.map, offset
+        )
+        if expires and expires <= time.time():
+            self._clear(offset)
+            return None
+        if touch:
+            struct.pack_into('<Q', self.map, offset + 16, time.monotonic_ns())
+        start = offset + ENTRY.size + key_size
+        return flags, self.map[start:start + size], expires
+
+    def _write(self, offset, digest, key, flags, data, expires):
+        start = offset + ENTRY.size
+        self.map[start:start + len(key)] = key
+        self.map[start + len(key):start + len(key) + len(data)] = data
+        ENTRY.pack_into(
+            self.map, offset, digest, expires, time.monotonic_ns(),
+            len(key), len(data), flags,
+        )
+
+    def _clear(self, offset):
+        struct.pack_into('<Q', self.map, offset, 0)
+
+    def fits(self, key, data):
+        return ENTRY.size + len(key) + len(data) <= self.slot_size
+
+    def get(self, key):
+        digest, number = self._place(key)
+        with self._locked(number):
+            found, _ = self._find(number, digest, key)
+            if found is None:
+                return None
+            item = self._read(found)
+        return item and item[:2]
+
+    def set(self, key, flags, data, expires, replace=True):
+        """Записывает значение; без replace — только если ключа нет."""
+        digest, number = self._place(key)
+        with self._locked(number):
+            found, target = self._find(number, digest, key)
+            if found is not None:
+                if not replace and self._read(found, touch=False):
+                    return False
+            if not self.fits(key, data):
+                # Не помещается: старое значение не должно пережить set.
+                if found is not None:
+                    self._clear(found)
+                return False
+            self._write(target, digest, key, flags, data, expires)
+        return True
+
+    def update(self, key, func):
+        """Заменяет значение на func(флаги, данные) -> (флаги, данные,
+        результат) и возвращает результат; нет ключа — KeyError."""
+        digest, number = self._place(key)
+        with self._locked(number):
+            found, _ = self._find(number, digest, key)
+            item = found is not None and self._read(found)
+            if not item:
+                raise KeyError(key)
+            flags, data, result = func(*item[:2])
+            if not self.fits(key, data):
+                raise ValueError('Значение не помещается в ячейку.')
+            self._write(found, digest, key, flags, data, item[2])
+        return result
+
+    def touch(self, key, expires):
+        digest, number = self._place(key)
+        with self._locked(number):
+            found, _ = self._find(number, digest, key)
+            if found is None or not self._read(found):
+                return False
+            struct.pack_into('<d', self.map, found + 8, expires)
+        return True
+
+    def delete(self, key):
+        digest, number = self._place(key)
+        with self._locked(number):
+            found, _ = self._find(number, digest, key)
+            if found is not None:
+                self._clear(found)
+        return found is not None
+
+    def clear(self):
+        for lock in self.stripes:
+            lock.acquire()
+        try:
+            with self._file_lock():
+                for offset in range(HEADER_SIZE, len(self.map),
+                                    self.slot_size):
+                    self._clear(offset)
+        finally:
+            for lock in self.stripes:
+                lock.release()
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def get_table(path, size, slot_size, ways):
+    """Таблица файла path; одна на процесс, см. Table."""
+    with _tables_lock:
+        table = _tables.get(path)
+        if table is None:
+            table = _tables[path] = Table(path, size, slot_size, ways)
+    return table
+
+
+class SharedMemoryCache(BaseCache):
+    """Кэш, общий для всех процессов сайта на одном хосте.
+
+    LOCATION — путь к файлу таблицы, лучше в tmpfs (/dev/shm).
+    OPTIONS: SIZE — размер в байтах, SLOT_SIZE — размер ячейки,
+    то есть предел для ключа со значением, WAYS — ячеек в наборе.
+    Значение больше ячейки не кэшируется. MAX_ENTRIES и
+    CULL_FREQUENCY не используются: место ограничено SIZE.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._table = get_table(
+            location,
+            options.get('SIZE', 64 * 1024 * 1024),
+            options.get('SLOT_SIZE', 16 * 1024),
+            options.get('WAYS', 8),
+        )
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key.encode()
+
+    def _expires(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        return 0.0 if expires is None else expires
+
+    def _encode(self, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) >= COMPRESS_MIN:
+            packed = zlib.compress(data, 1)
+            if len(packed) < len(data):
+                return COMPRESSED, packed
+        return 0, data
+
+    def _decode(self, flags, data):
+        """Значение ячейки; битое или чужого формата — ValueError."""
+        try:
+            if flags & COMPRESSED:
+                data = zlib.decompress(data)
+            return pickle.loads(data)
+        except Exception as error:
+            raise ValueError(f'Не удалось прочитать значение: {error}')
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        item = self._table.get(key)
+        if item is None:
+            return default
+        try:
+            return self._decode(*item)
+        except ValueError:
+            # Промах вместо ошибки на странице; ячейка освобождается.
+            self._table.delete(key)
+            return default
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._table.set(
+            self._key(key, version), *self._encode(value),
+            self._expires(timeout),
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._table.set(
+            self._key(key, version), *self._encode(value),
+            self._expires(timeout), replace=False,
+        )
+
+    def incr(self, key, delta=1, version=None):
+        def bump(flags, data):
+            value = self._decode(flags, data) + delta
+            return (*self._encode(value), value)
+
+        try:
+            return self._table.update(self._key(key, version), bump)
+        except KeyError:
+            raise ValueError(f"Key '{key}' not found")
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._table.touch(
+            self._key(key, version), self._expires(timeout)
+        )
+
+    def delete(self, key, version=None):
+        self._table.delete(self._key(key, version))
+
+    def clear(self):
+        self._table.clear()
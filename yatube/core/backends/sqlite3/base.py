@@ -0,0 +1,53 @@
+from django.db.backends.sqlite3 import base
+
+# Значения по умолчанию; OPTIONS['pragmas'] в DATABASES их дополняет.
+PRAGMAS = {
+    # Действует только для новой базы, до создания таблиц; старую
+    # переводит manage.py maintain_db --enable-incremental-vacuum.
+    # Базе в памяти не нужен: там он только добавляет блокировки.
+    'auto_vacuum': 'INCREMENTAL',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite, настроенный под конкурентные чтения и записи сайта.
+
+    Каждое новое соединение получает PRAGMA из OPTIONS['pragmas']:
+    WAL позволяет читать во время записи, а busy_timeout заставляет
+    писателей ждать друг друга вместо ошибки database is locked.
+    OPTIONS['transaction_mode'] задает, как начинаются транзакции:
+    с IMMEDIATE блокировка записи берется сразу, и транзакция
+    не падает при попытке перейти от чтения к записи.
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **params.pop('pragmas', {})}
+        if self.is_in_memory_db():
+            self.pragmas.pop('auto_vacuum', None)
+        self.transaction_mode = params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def enable_constraint_checking(self):
+        # Схема меняется с выключенными внешними ключами; выключенные
+        # в OPTIONS['pragmas'] после миграций не включаем.
+        if str(self.pragmas.get('foreign_keys')).upper() != 'OFF':
+            super().enable_constraint_checking()
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,68 @@
+import math
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _store(key, compute, timeout, grace):
+    """Считает значение и кладет его вместе со сроком свежести
+    и временем расчета."""
+    started = time.time()
+    value = compute()
+    now = time.time()
+    if timeout is None:
+        cache.set(key, (value, math.inf, now - started), None)
+    else:
+        cache.set(key, (value, now + timeout, now - started), timeout + grace)
+    return value
+
+
+def _is_fresh(expires, delta, beta):
+    """XFetch: пересчет начинается раньше срока с вероятностью, тем
+    большей, чем ближе срок и чем дольше считается значение."""
+    return time.time() - delta * beta * math.log(1 - random.random()) < expires
+
+
+def fetch(key, compute, timeout, grace=None, beta=None):
+    """Значение из кэша или compute() без толпы пересчетов.
+
+    Через timeout секунд значение черствеет, но еще grace секунд
+    отдается, пока его пересчитывает один запрос — тот, кто взял
+    блокировку в кэше; промахи по одному ключу тоже ждут его, а не
+    считают сами. С кэшем в памяти процесса блокировка общая только
+    для его потоков, с SharedMemoryCache — для всего хоста.
+    """
+    grace = settings.STAMPEDE_GRACE if grace is None else grace
+    beta = settings.STAMPEDE_BETA if beta is None else beta
+    lock_key = _lock_key(key)
+    lock_timeout = settings.STAMPEDE_LOCK_TIMEOUT
+    token = uuid.uuid4().hex
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires, delta = entry
+        if _is_fresh(expires, delta, beta):
+            return value
+        if not cache.add(lock_key, token, lock_timeout):
+            return value
+    else:
+        deadline = time.monotonic() + lock_timeout
+        while not cache.add(lock_key, token, lock_timeout):
+            time.sleep(settings.STAMPEDE_WAIT_STEP)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+            if time.monotonic() > deadline:
+                # Пересчет завис или упал: считаем сами.
+                return _store(key, compute, timeout, grace)
+    try:
+        return _store(key, compute, timeout, grace)
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
@@ -0,0 +1,28 @@
+from django.conf import settings
+
+
+def query_budget(limit, sharded=None):
+    """Объявляет, сколько запросов к БД может сделать view за один запрос.
+
+    sharded — бюджет при POST_SHARDS, если он больше: связи постов
+    из default там подгружаются отдельными запросами. Бюджет проверяет
+    QueryInspectorMiddleware и тесты posts.
+    """
+    def decorator(view):
+        view.query_budget = limit
+        view.sharded_query_budget = limit if sharded is None else sharded
+        return view
+    return decorator
+
+
+def budget_of(view):
+    """Бюджет view при текущих настройках; None — не объявлен."""
+    if settings.POST_SHARDS:
+        return getattr(view, 'sharded_query_budget', None)
+    return getattr(view, 'query_budget', None)
+
+
+def read_replica(view):
+    """Разрешает view читать из реплики, см. ReadReplicaMiddleware."""
+    view.read_replica = True
+    return view
@@ -0,0 +1,40 @@
+import time
+
+from django.core.cache import cache
+
+
+def _generation_key(tag):
+    return f'tag:{tag}'
+
+
+def _new_generation():
+    return int(time.time() * 1000)
+
+
+def generations(tags):
+    """Текущие поколения тегов, недостающие заводятся."""
+    keys = [_generation_key(tag) for tag in tags]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # add не перетрет поколение, которое успел завести сосед.
+            cache.add(key, _new_generation(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def invalidate(*tags):
+    """Сдвигает поколения тегов: зависящие от них записи больше
+    не читаются и доживают в кэше до вытеснения."""
+    for tag in dict.fromkeys(tags):
+        key = _generation_key(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_generation(), None)
+
+
+def tagged_key(key, tags):
+    """Ключ записи, зависящей от tags: в него входят их поколения,
+    поэтому invalidate любого тега меняет ключ без перебора записей."""
+    return '{}:{}'.format(key, '.'.join(map(str, generations(tags))))
@@ -0,0 +1,148 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('yatube.slow_requests')
+
+
+def explain(alias, sql, params):
+    """План запроса в виде строк; для не-SELECT и ошибок — None."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    connection = connections[alias]
+    prefix = (
+        'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    )
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return [
+                ' '.join(str(column) for column in row)
+                for row in cursor.fetchall()
+            ]
+    except Exception as error:
+        return [f'{type(error).__name__}: {error}']
+
+
+def process_path(path):
+    """Файл журнала этого процесса: RotatingFileHandler не умеет
+    ротировать файл, в который пишут несколько воркеров."""
+    root, ext = os.path.splitext(path)
+    return f'{root}.{os.getpid()}{ext}'
+
+
+def entry(request, response, duration, recorder):
+    """Запись журнала: все запросы к БД, план добавит писатель.
+
+    Параметры запросов нужны только для EXPLAIN и в файл не попадают:
+    среди них ключи сессий и хэши паролей.
+    """
+    match = getattr(request, 'resolver_match', None)
+    user = getattr(request, 'user', None)
+    return {
+        'view': match.view_name if match else None,
+        'path': request.path,
+        'method': request.method,
+        'status': response.status_code,
+        'duration': duration,
+        'params': {key: request.GET.getlist(key) for key in request.GET},
+        'kwargs': match.kwargs if match else {},
+        'user_id': user.pk if user is not None else None,
+        'queries': [
+            {
+                'alias': query.alias,
+                'sql': query.sql,
+                'params': query.params,
+                'duration': query.duration,
+            }
+            for query in recorder.queries
+        ],
+    }
+
+
+class Journal(threading.Thread):
+    """Пишет медленные запросы в ротируемый файл JSON Lines,
+    у каждого процесса свой.
+
+    Запрос к сайту только кладет запись в очередь; EXPLAIN и запись
+    на диск делает отдельный поток. Если очередь полна, запись
+    теряется — журнал не должен тормозить сайт.
+    """
+
+    def __init__(self, path, max_bytes, backups, explain_count, size):
+        super().__init__(name='slow-request-journal', daemon=True)
+        self.queue = queue.Queue(size)
+        self.explain_count = explain_count
+        self.dropped = 0
+        self.path = process_path(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.handler = RotatingFileHandler(
+            self.path, maxBytes=max_bytes, backupCount=backups,
+            encoding='utf-8',
+        )
+
+    def record(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Дожидается, пока все записи из очереди окажутся на диске."""
+        self.queue.join()
+
+    def write(self, item):
+        slowest = sorted(
+            item['queries'], key=lambda query: query['duration'],
+            reverse=True,
+        )[:self.explain_count]
+        for query in slowest:
+            query['plan'] = explain(
+                query['alias'], query['sql'], query['params']
+            )
+        for query in item['queries']:
+            del query['params']
+        record = logging.makeLogRecord({
+            'msg': json.dumps(item, ensure_ascii=False, default=str),
+        })
+        self.handler.emit(record)
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                self.write(item)
+            except Exception:
+                logger.exception('Не удалось записать медленный запрос')
+            finally:
+                if self.queue.empty():
+                    connections.close_all()
+                self.queue.task_done()
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    """Общий для процесса журнал; поток стартует при первом обращении."""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = Journal(
+                settings.SLOW_REQUEST_JOURNAL,
+                settings.SLOW_REQUEST_MAX_BYTES,
+                settings.SLOW_REQUEST_BACKUPS,
+                settings.SLOW_REQUEST_EXPLAIN,
+                settings.SLOW_REQUEST_QUEUE_SIZE,
+            )
+            _journal.start()
+            atexit.register(_journal.flush)
+    return _journal
@@ -0,0 +1,170 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('yatube.maintenance')
+
+
+def _pragma(cursor, name):
+    cursor.execute(f'PRAGMA {name}')
+    return cursor.fetchone()[0]
+
+
+def wal_bytes(alias='default'):
+    path = connections[alias].settings_dict['NAME'] + '-wal'
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
+
+
+def stats(alias='default'):
+    """Размер базы, свободные страницы и размер WAL."""
+    with connections[alias].cursor() as cursor:
+        result = {
+            name: _pragma(cursor, name)
+            for name in ('page_size', 'page_count', 'freelist_count',
+                         'auto_vacuum')
+        }
+    result['wal_bytes'] = wal_bytes(alias)
+    return result
+
+
+def optimize(alias='default', analyze=False):
+    """Обновляет статистику планировщика.
+
+    PRAGMA optimize пересчитывает только устаревшие таблицы и читает
+    не больше analysis_limit строк индекса; ANALYZE — все и целиком.
+    """
+    with connections[alias].cursor() as cursor:
+        if analyze:
+            cursor.execute('ANALYZE')
+        else:
+            limit = settings.MAINTENANCE_ANALYSIS_LIMIT
+            cursor.execute(f'PRAGMA analysis_limit = {limit}')
+            cursor.execute('PRAGMA optimize')
+
+
+def checkpoint(alias='default', threshold=None):
+    """Переносит WAL в базу.
+
+    Пока WAL меньше threshold байт, checkpoint пассивный и никого
+    не ждет; больший WAL обрезается до нуля (TRUNCATE), для этого
+    ждем окончания текущих чтений. Возвращает (busy, log, checkpointed)
+    из PRAGMA wal_checkpoint.
+    """
+    if threshold is None:
+        threshold = settings.MAINTENANCE_CHECKPOINT_BYTES
+    mode = 'TRUNCATE' if wal_bytes(alias) > threshold else 'PASSIVE'
+    with connections[alias].cursor() as cursor:
+        cursor.execute(f'PRAGMA wal_checkpoint({mode})')
+        return mode, cursor.fetchone()
+
+
+def incremental_vacuum(alias='default', budget=None, step=None, pause=None):
+    """Возвращает свободные страницы файловой системе.
+
+    Освобождает по step страниц за раз, делая паузы, чтобы записи
+    сайта не ждали, и останавливается через budget секунд. Работает
+    только при auto_vacuum = INCREMENTAL; возвращает число страниц.
+    """
+    budget = settings.MAINTENANCE_VACUUM_BUDGET if budget is None else budget
+    step = settings.MAINTENANCE_VACUUM_STEP if step is None else step
+    pause = settings.MAINTENANCE_VACUUM_PAUSE if pause is None else pause
+    deadline = time.monotonic() + budget
+    freed = 0
+    with connections[alias].cursor() as cursor:
+        if _pragma(cursor, 'auto_vacuum') != 2:
+            return 0
+        while time.monotonic() < deadline:
+            before = _pragma(cursor, 'freelist_count')
+            if not before:
+                break
+            # execute() делает один шаг оператора, то есть освобождает
+            # одну страницу; executescript() выполняет его до конца.
+            cursor.executescript(f'PRAGMA incremental_vacuum({step});')
+            freed += before - _pragma(cursor, 'freelist_count')
+            time.sleep(pause)
+    return freed
+
+
+def enable_incremental_vacuum(alias='default'):
+    """Включает auto_vacuum = INCREMENTAL для существующей базы.
+
+    Требует полного VACUUM: база переписывается целиком и на это
+    время заблокирована. Новые базы получают режим из PRAGMA бэкенда.
+    """
+    with connections[alias].cursor() as cursor:
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.execute('VACUUM')
+
+
+def run(alias='default', analyze=False):
+    """Полный проход обслуживания; пишет в журнал состояние до и после."""
+    if connections[alias].vendor != 'sqlite':
+        return None
+    before = stats(alias)
+    started = time.monotonic()
+    optimize(alias, analyze)
+    freed = incremental_vacuum(alias)
+    mode, result = checkpoint(alias)
+    after = stats(alias)
+    report = {
+        'before': before,
+        'after': after,
+        'vacuumed_pages': freed,
+        'checkpoint': mode,
+        'checkpoint_busy': bool(result[0]),
+        'duration': time.monotonic() - started,
+    }
+    logger.info(
+        'Обслуживание %s за %.2f с: страниц %d -> %d, свободных %d -> %d, '
+        'WAL %d -> %d байт (%s%s)',
+        alias, report['duration'],
+        before['page_count'], after['page_count'],
+        before['freelist_count'], after['freelist_count'],
+        before['wal_bytes'], after['wal_bytes'],
+        mode, ', занято' if result[0] else '',
+    )
+    return report
+
+
+class Scheduler(threading.Thread):
+    """Раз в interval секунд обслуживает базы MAINTENANCE_DATABASES."""
+
+    def __init__(self, interval):
+        super().__init__(name='db-maintenance', daemon=True)
+        self.interval = interval
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            for alias in settings.MAINTENANCE_DATABASES:
+                try:
+                    run(alias)
+                except Exception:
+                    logger.exception('Обслуживание %s не удалось', alias)
+            connections.close_all()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Общий для процесса планировщик; стартует при первом обращении."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler(settings.MAINTENANCE_INTERVAL)
+            _scheduler.start()
+    return _scheduler
+
+
+def start_scheduler(sender, **kwargs):
+    """Обработчик request_started: планировщик живет в процессах сайта."""
+    get_scheduler()
@@ -0,0 +1,122 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'shared': 'core.backends.shm.SharedMemoryCache',
+}
+
+
+def make_cache(name, directory, keys, size):
+    options = {'MAX_ENTRIES': keys * 2, 'SIZE': size}
+    location = {
+        'locmem': name,
+        'file': os.path.join(directory, 'files'),
+        'shared': os.path.join(directory, 'cache.shm'),
+    }[name]
+    return import_string(BACKENDS[name])(
+        location, {'TIMEOUT': None, 'OPTIONS': options}
+    )
+
+
+def work(name, directory, keys, size, value_size, writes, duration, seed):
+    """Процесс нагрузки: чтение популярных ключей, при промахе — запись.
+
+    Популярность ключей распределена по Парето, как у страниц лент.
+    Возвращает (операций, попаданий, промахов).
+    """
+    cache = make_cache(name, directory, keys, size)
+    rng = random.Random(seed)
+    value = os.urandom(value_size)
+    operations = hits = misses = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            key = f'bench:{int(rng.paretovariate(1.1)) % keys}'
+            if rng.random() < writes:
+                cache.set(key, value)
+            elif cache.get(key) is None:
+                misses += 1
+                cache.set(key, value)
+            else:
+                hits += 1
+            operations += 1
+    return operations, hits, misses
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность кэшей LocMem, FileBased '
+        'и общего кэша в памяти при нескольких процессах.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends', nargs='+', default=list(BACKENDS),
+            choices=list(BACKENDS),
+        )
+        parser.add_argument(
+            '--processes', type=int, default=4,
+            help='Процессов, как воркеров gunicorn.',
+        )
+        parser.add_argument(
+            '--duration', type=float, default=5,
+            help='Секунд нагрузки на каждый кэш.',
+        )
+        parser.add_argument('--keys', type=int, default=5000)
+        parser.add_argument(
+            '--value-size', type=int, default=2000,
+            help='Размер значения в байтах.',
+        )
+        parser.add_argument(
+            '--writes', type=float, default=0.05,
+            help='Доля записей помимо записей при промахе.',
+        )
+        parser.add_argument(
+            '--size', type=int, default=64 * 1024 * 1024,
+            help='Размер общего кэша в байтах.',
+        )
+
+    def handle(self, *args, **options):
+        if options['processes'] < 1:
+            raise CommandError('Нужен хотя бы один процесс.')
+        self.stdout.write(
+            '{:<8} {:>12} {:>10} {:>8}'.format(
+                'кэш', 'операций/с', 'на процесс', 'попаданий'
+            )
+        )
+        for name in options['backends']:
+            directory = tempfile.mkdtemp(prefix='cache-benchmark-')
+            try:
+                operations, hits, misses = self.run(name, directory, options)
+            finally:
+                shutil.rmtree(directory)
+            rate = operations / options['duration']
+            self.stdout.write('{:<8} {:>12.0f} {:>10.0f} {:>8.1%}'.format(
+                name, rate, rate / options['processes'],
+                hits / max(hits + misses, 1),
+            ))
+
+    def run(self, name, directory, options):
+        processes = options['processes']
+        with ProcessPoolExecutor(processes) as executor:
+            results = list(executor.map(
+                work,
+                [name] * processes,
+                [directory] * processes,
+                [options['keys']] * processes,
+                [options['size']] * processes,
+                [options['value_size']] * processes,
+                [options['writes']] * processes,
+                [options['duration']] * processes,
+                range(processes),
+            ))
+        return [sum(column) for column in zip(*results)]
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import maintenance
+
+
+class Command(BaseCommand):
+    help = (
+        'Обслуживает базу SQLite: статистика планировщика, incremental '
+        'vacuum небольшими шагами и checkpoint WAL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Полный ANALYZE вместо PRAGMA optimize.',
+        )
+        parser.add_argument(
+            '--enable-incremental-vacuum', action='store_true',
+            help='Перевести базу в auto_vacuum = INCREMENTAL. Делает полный '
+                 'VACUUM и блокирует базу до конца.',
+        )
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if connections[alias].vendor != 'sqlite':
+            raise CommandError('Обслуживание есть только для SQLite.')
+        if options['enable_incremental_vacuum']:
+            maintenance.enable_incremental_vacuum(alias)
+        report = maintenance.run(alias, options['analyze'])
+        for name in ('page_count', 'freelist_count', 'wal_bytes'):
+            self.stdout.write('{:<15} {:>12} -> {}'.format(
+                name, report['before'][name], report['after'][name]
+            ))
+        self.stdout.write(
+            f'Освобождено страниц: {report["vacuumed_pages"]}, '
+            f'checkpoint {report["checkpoint"]}, '
+            f'{report["duration"]:.2f} с'
+        )
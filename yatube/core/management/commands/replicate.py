@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from core.replication import replicate
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу в реплику для чтения лент.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--replica', default=settings.READ_REPLICA or 'replica',
+        )
+        parser.add_argument(
+            '--interval', type=float,
+            help='Повторять раз в столько секунд, пока не остановят.',
+        )
+
+    def handle(self, *args, **options):
+        def report(pages, duration):
+            self.stdout.write(
+                f'{options["replica"]}: {pages} страниц за {duration:.2f} с'
+            )
+
+        try:
+            replicate(
+                options['database'], options['replica'],
+                options['interval'], report,
+            )
+        except ValueError as error:
+            raise CommandError(error)
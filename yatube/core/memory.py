@@ -0,0 +1,97 @@
+import threading
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+def start():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(settings.MEMORY_TRACE_FRAMES)
+
+
+def _reset_peak():
+    """Сбрасывает пик до текущего объема выделений."""
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+        return
+    # До Python 3.9 reset_peak нет: пик сбрасывает только перезапуск,
+    # а с ним теряются и трассы прежних выделений.
+    tracemalloc.stop()
+    start()
+
+
+@contextmanager
+def traced():
+    """Считает пик и остаток памяти, выделенной внутри блока.
+
+    tracemalloc общий для процесса: при параллельных запросах в потоках
+    пик одного запроса включает выделения соседних.
+    """
+    start()
+    result = {}
+    _reset_peak()
+    # Отсчет после сброса: перезапуск обнуляет и текущий объем.
+    before = tracemalloc.get_traced_memory()[0]
+    try:
+        yield result
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        result['peak'] = max(peak - before, 0)
+        result['retained'] = current - before
+
+
+def top_sites(snapshot, limit=20, base=None):
+    """Места с наибольшими выделениями: по снимку или по разнице снимков."""
+    filters = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    )
+    snapshot = snapshot.filter_traces(filters)
+    if base is not None:
+        stats = [
+            stat for stat in snapshot.compare_to(
+                base.filter_traces(filters), 'lineno'
+            )
+            if stat.size_diff > 0
+        ]
+    else:
+        stats = snapshot.statistics('lineno')
+    sites = []
+    for stat in stats[:limit]:
+        frame = stat.traceback[0]
+        sites.append({
+            'site': f'{frame.filename}:{frame.lineno}',
+            'size': getattr(stat, 'size_diff', stat.size),
+            'count': getattr(stat, 'count_diff', stat.count),
+        })
+    return sites
+
+
+class ViewMemory:
+    """Пики и остатки выделений по view за время работы процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(lambda: {
+            'requests': 0,
+            'peak_max': 0,
+            'peak_total': 0,
+            'retained_total': 0,
+        })
+
+    def record(self, view, peak, retained):
+        with self.lock:
+            stats = self.views[view]
+            stats['requests'] += 1
+            stats['peak_max'] = max(stats['peak_max'], peak)
+            stats['peak_total'] += peak
+            stats['retained_total'] += retained
+
+    def as_dict(self):
+        with self.lock:
+            return {view: dict(stats) for view, stats in self.views.items()}
+
+
+views = ViewMemory()
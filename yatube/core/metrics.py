@@ -0,0 +1,183 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Границы корзин гистограммы времени ответа, в секундах.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_local = threading.local()
+
+
+class RequestTimings:
+    """Сколько времени запрос к сайту провел в БД, шаблонах, кэше и т. д."""
+
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def add(self, name, duration):
+        self.durations[name] += duration
+        self.counts[name] += 1
+
+
+def start_request():
+    _local.timings = RequestTimings()
+    return _local.timings
+
+
+def finish_request():
+    _local.timings = None
+
+
+def current():
+    return getattr(_local, 'timings', None)
+
+
+@contextmanager
+def timed(name):
+    """Засчитывает время блока в категорию name текущего запроса.
+
+    Вложенные блоки той же категории не считаются дважды; значение
+    блока — True для самого внешнего из них.
+    """
+    active = _local.__dict__.setdefault('active', set())
+    if name in active:
+        yield False
+        return
+    active.add(name)
+    started = time.perf_counter()
+    try:
+        yield True
+    finally:
+        active.discard(name)
+        timings = current()
+        if timings is not None:
+            timings.add(name, time.perf_counter() - started)
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper: время SQL-запросов идет в категорию db."""
+    with timed('db'):
+        return execute(sql, params, many, context)
+
+
+def _labels(**labels):
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\').replace(
+            '"', r'\"'
+        ).replace('\n', r'\n'))
+        for name, value in labels.items()
+    )
+
+
+class Registry:
+    """Метрики процесса в памяти, выдаются в текстовом формате Prometheus.
+
+    Запись и выдача стоят O(числа рядов), поэтому /metrics можно
+    опрашивать хоть каждую секунду. У каждого процесса сервера
+    свои метрики.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = defaultdict(int)
+            self.histograms = defaultdict(lambda: [0] * (len(BUCKETS) + 1))
+            self.durations = defaultdict(float)
+            self.spent = defaultdict(float)
+            self.queries = defaultdict(int)
+            self.cache = defaultdict(int)
+
+    def observe(self, view, method, status, duration, timings):
+        bucket = bisect_left(BUCKETS, duration)
+        with self.lock:
+            self.requests[view, method, status] += 1
+            self.histograms[view][bucket] += 1
+            self.durations[view] += duration
+            self.queries[view] += timings.counts['db']
+            for name, spent in timings.durations.items():
+                self.spent[view, name] += spent
+
+    def cache_lookup(self, hits, misses):
+        with self.lock:
+            self.cache['hit'] += hits
+            self.cache['miss'] += misses
+
+    def render(self):
+        with self.lock:
+            requests = dict(self.requests)
+            histograms = {view: list(counts)
+                          for view, counts in self.histograms.items()}
+            durations = dict(self.durations)
+            spent = dict(self.spent)
+            queries = dict(self.queries)
+            cache = dict(self.cache)
+        lines = [
+            '# HELP yatube_requests_total Ответы по view, методу и статусу.',
+            '# TYPE yatube_requests_total counter',
+        ]
+        for (view, method, status), count in sorted(requests.items()):
+            lines.append('yatube_requests_total{%s} %d' % (
+                _labels(view=view, method=method, status=status), count
+            ))
+        lines += [
+            '# HELP yatube_request_duration_seconds Время ответа view.',
+            '# TYPE yatube_request_duration_seconds histogram',
+        ]
+        for view, counts in sorted(histograms.items()):
+            total = 0
+            for bound, count in zip((*BUCKETS, '+Inf'), counts):
+                total += count
+                lines.append(
+                    'yatube_request_duration_seconds_bucket{%s} %d' % (
+                        _labels(view=view, le=bound), total
+                    )
+                )
+            lines.append('yatube_request_duration_seconds_sum{%s} %.6f' % (
+                _labels(view=view), durations[view]
+            ))
+            lines.append('yatube_request_duration_seconds_count{%s} %d' % (
+                _labels(view=view), total
+            ))
+        lines += [
+            '# HELP yatube_db_queries_total SQL-запросы по view.',
+            '# TYPE yatube_db_queries_total counter',
+        ]
+        for view, count in sorted(queries.items()):
+            lines.append('yatube_db_queries_total{%s} %d' % (
+                _labels(view=view), count
+            ))
+        lines += [
+            '# HELP yatube_time_spent_seconds_total Время в БД, шаблонах, '
+            'кэше и миниатюрах по view.',
+            '# TYPE yatube_time_spent_seconds_total counter',
+        ]
+        for (view, name), seconds in sorted(spent.items()):
+            lines.append('yatube_time_spent_seconds_total{%s} %.6f' % (
+                _labels(view=view, part=name), seconds
+            ))
+        lines += [
+            '# HELP yatube_cache_lookups_total Чтения кэша: hit или miss.',
+            '# TYPE yatube_cache_lookups_total counter',
+        ]
+        for result in ('hit', 'miss'):
+            lines.append('yatube_cache_lookups_total{%s} %d' % (
+                _labels(result=result), cache.get(result, 0)
+            ))
+        lookups = cache.get('hit', 0) + cache.get('miss', 0)
+        lines += [
+            '# HELP yatube_cache_hit_ratio Доля попаданий в кэш.',
+            '# TYPE yatube_cache_hit_ratio gauge',
+            'yatube_cache_hit_ratio %.6f' % (
+                cache.get('hit', 0) / lookups if lookups else 0
+            ),
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
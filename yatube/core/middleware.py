@@ -0,0 +1,225 @@
+import logging
+import os
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import journal, memory, metrics, profiling, routers
+from .decorators import budget_of
+from .queries import QueryRecorder
+
+logger = logging.getLogger('yatube.queries')
+
+
+class QueryBudgetExceeded(Exception):
+    """View сделала больше запросов, чем объявлено, или словила N+1."""
+
+
+def view_budget(request):
+    match = getattr(request, 'resolver_match', None)
+    return budget_of(match.func) if match else None
+
+
+class QueryInspectorMiddleware:
+    """Считает запросы к БД на каждый запрос к сайту (разработка и тесты).
+
+    Пишет в журнал повторяющиеся виды запросов (N+1) и превышение
+    бюджета из @query_budget; в строгом режиме бросает исключение.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTOR_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        response['X-Query-Count'] = len(recorder)
+        problems = self.inspect(request, recorder)
+        for problem in problems:
+            logger.warning('%s %s', request.path, problem)
+        if problems and settings.QUERY_INSPECTOR_STRICT:
+            raise QueryBudgetExceeded(f'{request.path}: {problems}')
+        return response
+
+    def inspect(self, request, recorder):
+        problems = []
+        budget = view_budget(request)
+        if budget is not None and len(recorder) > budget:
+            problems.append(
+                f'{len(recorder)} запросов при бюджете {budget}'
+            )
+        threshold = settings.QUERY_INSPECTOR_REPEAT_THRESHOLD
+        for shape, count in recorder.repeated(threshold):
+            problems.append(f'N+1: {count} раз {shape}')
+        return problems
+
+
+class ServerTimingMiddleware:
+    """Замеряет, на что ушло время запроса, и отдает это в заголовке
+    Server-Timing, а итоги копит для /metrics."""
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = metrics.start_request()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.record_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            metrics.finish_request()
+        duration = time.perf_counter() - started
+        response['Server-Timing'] = self.header(timings, duration)
+        match = getattr(request, 'resolver_match', None)
+        metrics.registry.observe(
+            match.view_name if match else 'unresolved',
+            request.method,
+            response.status_code,
+            duration,
+            timings,
+        )
+        return response
+
+    def header(self, timings, duration):
+        parts = [
+            '{};dur={:.1f};desc="{}"'.format(
+                name, timings.durations[name] * 1000, timings.counts[name]
+            )
+            for name in ('db', 'write', 'template', 'cache', 'thumbnail')
+            if name in timings.durations
+        ]
+        parts.append('total;dur={:.1f}'.format(duration * 1000))
+        return ', '.join(parts)
+
+
+class ProfilerMiddleware:
+    """Профилирование по запросу и сэмплирование всех запросов.
+
+    Запрос идет под cProfile, если в нем есть заголовок X-Profile
+    с токеном из manage.py profile_token или его шлет сотрудник с ?_profile.
+    Имя файла профиля возвращается в заголовке X-Profile.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sampler = None
+        if settings.PROFILER_SAMPLING:
+            self.sampler = profiling.get_sampler()
+
+    def __call__(self, request):
+        try:
+            if not self.requested(request):
+                return self.get_response(request)
+            response, path = profiling.profile(self.get_response, request)
+            response['X-Profile'] = os.path.basename(path)
+            return response
+        finally:
+            if self.sampler is not None:
+                self.sampler.untrack()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.sampler is not None:
+            self.sampler.track(request.resolver_match.view_name)
+
+    def requested(self, request):
+        token = request.META.get('HTTP_X_PROFILE')
+        if token:
+            return profiling.check_token(token)
+        user = getattr(request, 'user', None)
+        return '_profile' in request.GET and bool(user and user.is_staff)
+
+
+class MemoryTracingMiddleware:
+    """Пик и остаток выделенной памяти по view через tracemalloc.
+
+    Трассировка замедляет весь процесс, поэтому включается только
+    настройкой MEMORY_TRACING; итоги — на /debug/memory/.
+    """
+
+    def __init__(self, get_response):
+        if not settings.MEMORY_TRACING:
+            raise MiddlewareNotUsed
+        memory.start()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with memory.traced() as allocated:
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        memory.views.record(
+            match.view_name if match else 'unresolved',
+            allocated['peak'],
+            allocated['retained'],
+        )
+        return response
+
+
+class SlowRequestMiddleware:
+    """Записывает в журнал запросы дольше SLOW_REQUEST_THRESHOLD секунд:
+    view, параметры, пользователя и все SQL-запросы с планами."""
+
+    def __init__(self, get_response):
+        if settings.SLOW_REQUEST_THRESHOLD is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        if duration >= settings.SLOW_REQUEST_THRESHOLD:
+            journal.get_journal().record(
+                journal.entry(request, response, duration, recorder)
+            )
+        return response
+
+
+class ReadReplicaMiddleware:
+    """Отправляет чтения view с @read_replica в реплику READ_REPLICA.
+
+    После запроса с записью (POST и т. п. или любой запрос, который
+    писал через core.writer.write) ставит cookie на
+    REPLICA_STICKY_SECONDS: пока она есть, пользователь читает
+    из default и видит свои изменения, даже если реплика отстает.
+    """
+
+    def __init__(self, get_response):
+        if not settings.READ_REPLICA:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Отметка могла остаться в потоке от прошлого запроса.
+        routers.take_written()
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.read_from(None)
+        # Подписка и отписка пишут и по GET.
+        written = routers.take_written()
+        if written or request.method not in (
+            'GET', 'HEAD', 'OPTIONS', 'TRACE'
+        ):
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS, httponly=True,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (getattr(view_func, 'read_replica', False)
+                and settings.REPLICA_STICKY_COOKIE not in request.COOKIES):
+            routers.read_from(settings.READ_REPLICA)
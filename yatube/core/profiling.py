@@ -0,0 +1,132 @@
+import cProfile
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+
+SALT = 'core.profiling'
+
+_numbers = itertools.count()
+
+
+def make_token():
+    """Значение заголовка X-Profile, действует PROFILER_TOKEN_MAX_AGE."""
+    return signing.dumps('profile', salt=SALT)
+
+
+def check_token(token):
+    try:
+        signing.loads(
+            token, salt=SALT, max_age=settings.PROFILER_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def _file_name(view, suffix):
+    os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+    # pid в имени: воркеры gunicorn пишут в один каталог.
+    name = '{}-{}-{}-{}.{}'.format(
+        time.strftime('%Y%m%d-%H%M%S'),
+        view.replace(':', '.'),
+        os.getpid(),
+        next(_numbers),
+        suffix,
+    )
+    return os.path.join(settings.PROFILER_DIR, name)
+
+
+def profile(get_response, request):
+    """Выполняет запрос под cProfile и сохраняет .prof с именем view."""
+    profiler = cProfile.Profile()
+    response = profiler.runcall(get_response, request)
+    match = getattr(request, 'resolver_match', None)
+    path = _file_name(match.view_name if match else 'unresolved', 'prof')
+    profiler.dump_stats(path)
+    return response, path
+
+
+def _stack(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(
+            f'{code.co_name} ({os.path.basename(code.co_filename)})'
+        )
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler(threading.Thread):
+    """Статистический профилировщик для всех запросов сразу.
+
+    Раз в interval секунд снимает стеки потоков, которые сейчас
+    обслуживают запросы, и копит их по view. Раз в window секунд
+    сбрасывает накопленное в файл .collapsed: строки "стек число",
+    которые понимают flamegraph.pl и speedscope.
+    """
+
+    def __init__(self, interval, window):
+        super().__init__(name='profiler-sampler', daemon=True)
+        self.interval = interval
+        self.window = window
+        self.requests = {}
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def track(self, view):
+        self.requests[threading.get_ident()] = view
+
+    def untrack(self):
+        self.requests.pop(threading.get_ident(), None)
+
+    def sample(self):
+        frames = sys._current_frames()
+        with self.lock:
+            for ident, view in list(self.requests.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.counts[f'{view};{_stack(frame)}'] += 1
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+        if not counts:
+            return None
+        path = _file_name('samples', 'collapsed')
+        with open(path, 'w') as output:
+            for stack, count in counts.most_common():
+                output.write(f'{stack} {count}\n')
+        return path
+
+    def run(self):
+        flushed = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            self.sample()
+            if time.monotonic() - flushed >= self.window:
+                self.flush()
+                flushed = time.monotonic()
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler():
+    """Общий для процесса сэмплер; запускается при первом обращении."""
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = Sampler(
+                settings.PROFILER_SAMPLE_INTERVAL,
+                settings.PROFILER_SAMPLE_WINDOW,
+            )
+            _sampler.start()
+    return _sampler
@@ -0,0 +1,70 @@
+import re
+import time
+from collections import Counter, namedtuple
+from contextlib import ExitStack
+
+from django.db import connections
+
+Query = namedtuple('Query', 'alias sql params duration')
+
+_IN_LIST = re.compile(r'IN \((%s, )*%s\)')
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def query_shape(sql):
+    """Вид запроса без значений: списки IN любой длины сводятся к одному."""
+    return _LITERALS.sub('?', _IN_LIST.sub('IN (...)', sql))
+
+
+class QueryRecorder:
+    """Записывает все SQL-запросы внутри блока with.
+
+    В отличие от CaptureQueriesContext не требует DEBUG и пишет время
+    выполнения каждого запроса, поэтому годится и для боевых замеров.
+    """
+
+    def __init__(self, aliases=None):
+        self.aliases = aliases
+        self.queries = []
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        aliases = self.aliases or [conn.alias for conn in connections.all()]
+        for alias in aliases:
+            self._stack.enter_context(
+                connections[alias].execute_wrapper(self._wrapper(alias))
+            )
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def _wrapper(self, alias):
+        def record(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.queries.append(Query(
+                    alias, sql, params, time.perf_counter() - started
+                ))
+        return record
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(query.duration for query in self.queries)
+
+    def repeated(self, threshold):
+        """Виды SELECT-запросов, выполненных не меньше threshold раз:
+        типичный след N+1."""
+        shapes = Counter(
+            query_shape(query.sql) for query in self.queries
+            if query.sql.lstrip().upper().startswith('SELECT')
+        )
+        return [
+            (shape, count) for shape, count in shapes.most_common()
+            if count >= threshold
+        ]
@@ -0,0 +1,36 @@
+import sqlite3
+import time
+
+from django.db import connections
+
+
+def copy(alias, path):
+    """Копирует базу alias в файл path через backup API SQLite.
+
+    Копия делается за один шаг и атомарна: читатели реплики видят
+    либо старую, либо новую базу целиком. Возвращает число страниц.
+    """
+    source = connections[alias]
+    source.ensure_connection()
+    target = sqlite3.connect(path)
+    try:
+        with source.wrap_database_errors:
+            source.connection.backup(target)
+        return target.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        target.close()
+
+
+def replicate(alias, replica, interval=None, report=None):
+    """Обновляет реплику; с interval — раз в interval секунд, без конца."""
+    path = connections[replica].settings_dict['NAME']
+    if path == connections[alias].settings_dict['NAME']:
+        raise ValueError(f'{replica} и {alias} — одна и та же база')
+    while True:
+        started = time.monotonic()
+        pages = copy(alias, path)
+        if report is not None:
+            report(pages, time.monotonic() - started)
+        if interval is None:
+            return
+        time.sleep(interval)
@@ -0,0 +1,54 @@
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_local = threading.local()
+
+
+def read_from(alias):
+    """Чтения текущего потока идут в alias; None — в default."""
+    _local.alias = alias
+
+
+def read_alias():
+    return getattr(_local, 'alias', None)
+
+
+def mark_written():
+    """Отмечает, что текущий поток писал в базу."""
+    _local.written = True
+
+
+def take_written():
+    """Писал ли поток в базу с прошлого вызова; отметка снимается."""
+    written = getattr(_local, 'written', False)
+    _local.written = False
+    return written
+
+
+class ReplicaRouter:
+    """Чтения моделей REPLICA_APPS в отмеченных view — из реплики,
+    все записи — в default, миграции — куда угодно, кроме реплики.
+
+    Какие запросы читают из реплики, решает ReadReplicaMiddleware.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = read_alias()
+        if alias and model._meta.app_label in settings.REPLICA_APPS:
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика — копия default: связи между ними допустимы.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схему реплика получает вместе с данными от replicate.
+        if db == (settings.READ_REPLICA or 'replica'):
+            return False
+        return None
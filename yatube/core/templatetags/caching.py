@@ -0,0 +1,45 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from core.caching import fetch
+
+register = template.Library()
+
+
+class CachedNode(template.Node):
+    def __init__(self, nodelist, timeout, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        timeout = self.timeout.resolve(context)
+        if timeout is not None:
+            timeout = int(timeout)
+        key = make_template_fragment_key(
+            self.fragment_name, [var.resolve(context) for var in self.vary_on]
+        )
+        return fetch(key, lambda: self.nodelist.render(context), timeout)
+
+
+@register.tag
+def cached(parser, token):
+    """Как {% cache %}, но через core.caching.fetch: черствый фрагмент
+    отдается, пока его пересчитывает один запрос.
+
+    {% cached timeout fragment_name [var1 var2 ...] %}...{% endcached %}
+    """
+    nodelist = parser.parse(('endcached',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]} ждет время жизни и имя фрагмента.'
+        )
+    return CachedNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(bit) for bit in tokens[3:]],
+    )
@@ -1,5 +1,13 @@
+import hmac
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render
 
+from . import memory, metrics
+
 
 def page_not_found(request, exception):
     return render(
@@ -9,3 +17,37 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def _metrics_allowed(request):
+    if request.user.is_active and request.user.is_staff:
+        return True
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and hmac.compare_digest(header, f'Bearer {token}')
+
+
+def metrics_view(request):
+    """Метрики процесса в текстовом формате Prometheus."""
+    if not _metrics_allowed(request):
+        raise Http404
+    return HttpResponse(
+        metrics.registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@staff_member_required
+def memory_view(request):
+    """Память по view и места с наибольшими выделениями сейчас."""
+    if not tracemalloc.is_tracing():
+        return JsonResponse({'tracing': False})
+    try:
+        limit = int(request.GET.get('limit', 20))
+    except ValueError:
+        limit = 20
+    return JsonResponse({
+        'tracing': True,
+        'views': memory.views.as_dict(),
+        'top': memory.top_sites(tracemalloc.take_snapshot(), limit),
+    })
@@ -0,0 +1,191 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Model
+
+from . import metrics, routers
+
+try:
+    import fcntl
+except ImportError:  # Windows: остается блокировка самой SQLite.
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path):
+    """Блокировка записи между процессами сайта."""
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _instances(func, args, kwargs):
+    """Объекты моделей, которые задание может сохранить: владелец
+    метода, объект ModelForm и модели среди аргументов."""
+    owner = getattr(func, '__self__', None)
+    candidates = (
+        owner, getattr(owner, 'instance', None), *args, *kwargs.values()
+    )
+    return [item for item in candidates if isinstance(item, Model)]
+
+
+def _snapshot(batch):
+    """Состояние объектов до пачки, чтобы после отката вернуть его."""
+    return [
+        (instance, instance.pk, instance._state.adding, instance._state.db)
+        for _, func, args, kwargs in batch
+        for instance in _instances(func, args, kwargs)
+    ]
+
+
+def _restore(snapshot):
+    for instance, pk, adding, db in snapshot:
+        instance.pk = pk
+        instance._state.adding = adding
+        instance._state.db = db
+
+
+class Writer(threading.Thread):
+    """Единственный поток процесса, который пишет в базу.
+
+    Собирает задания из очереди в пачки до batch_size штук и выполняет
+    пачку одной транзакцией под файловой блокировкой; каждое задание —
+    в своей точке сохранения, так что ошибка откатывает только его.
+    Результаты и исключения отдаются вызывающим после COMMIT.
+    """
+
+    def __init__(self, lock_path, batch_size, batch_wait):
+        super().__init__(name='db-writer', daemon=True)
+        self.lock_path = lock_path
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.queue = queue.SimpleQueue()
+        self.batches = 0
+        self.jobs = 0
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        self.queue.put((future, func, args, kwargs))
+        return future
+
+    def collect(self):
+        """Задания, уже стоящие в очереди, и пришедшие за batch_wait."""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get(
+                    timeout=max(deadline - time.monotonic(), 0)
+                ))
+            except queue.Empty:
+                break
+        return [
+            job for job in batch if job[0].set_running_or_notify_cancel()
+        ]
+
+    def execute(self, batch):
+        results = []
+        with file_lock(self.lock_path), transaction.atomic():
+            for future, func, args, kwargs in batch:
+                try:
+                    with transaction.atomic():
+                        results.append((future, func(*args, **kwargs)))
+                except Exception as error:
+                    future.set_exception(error)
+        return results
+
+    def commit(self, batch):
+        close_old_connections()
+        snapshot = _snapshot(batch)
+        try:
+            results = self.execute(batch)
+        except IntegrityError as error:
+            # Внешние ключи SQLite проверяются только при COMMIT:
+            # ищем виновника, выполняя задания пачки по одному.
+            pending = [job for job in batch if not job[0].done()]
+            if len(pending) > 1:
+                # Объекты получили pk в откатанной транзакции: без
+                # возврата повтор save() начался бы с UPDATE по этому pk
+                # и перезаписал бы строку, которая успела его занять.
+                # post_save уже отработали, но их записи в базу
+                # откатились, а сброс тегов кэша повторять не вредно.
+                _restore(snapshot)
+                for job in pending:
+                    self.commit([job])
+                return
+            for future, *_ in pending:
+                future.set_exception(error)
+            return
+        except Exception as error:
+            for future, *_ in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        self.batches += 1
+        self.jobs += len(batch)
+        for future, result in results:
+            future.set_result(result)
+
+    def run(self):
+        while True:
+            batch = self.collect()
+            if batch:
+                self.commit(batch)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Общий для процесса писатель; стартует при первом обращении."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            os.makedirs(os.path.dirname(settings.WRITER_LOCK_FILE),
+                        exist_ok=True)
+            _writer = Writer(
+                settings.WRITER_LOCK_FILE,
+                settings.WRITER_BATCH_SIZE,
+                settings.WRITER_BATCH_WAIT,
+            )
+            _writer.start()
+    return _writer
+
+
+def write(func, *args, **kwargs):
+    """Выполняет func(*args, **kwargs) в потоке-писателе.
+
+    Ждет COMMIT и возвращает результат func или бросает ее исключение.
+    При WRITER_ENABLED = False и внутри самого писателя func
+    вызывается сразу. TimeoutError бросается, только если за
+    WRITER_TIMEOUT задание так и не начало выполняться: оно снимается
+    с очереди и точно не запишется. Начатое задание дожидается COMMIT.
+    Вызывающий поток отмечается как писавший (routers.mark_written).
+    """
+    routers.mark_written()
+    if not settings.WRITER_ENABLED:
+        return func(*args, **kwargs)
+    writer = get_writer()
+    if threading.current_thread() is writer:
+        return func(*args, **kwargs)
+    future = writer.submit(func, *args, **kwargs)
+    with metrics.timed('write'):
+        try:
+            return future.result(settings.WRITER_TIMEOUT)
+        except TimeoutError:
+            if future.cancel():
+                raise
+            return future.result()
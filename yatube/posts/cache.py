@@ -0,0 +1,106 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template import loader
+from django.utils.safestring import mark_safe
+
+from core import caching, invalidation, routers
+
+from . import thumbnails
+
+CARD_TEMPLATE = 'includes/post_card.html'
+
+# Теги кэша, см. core.invalidation. Лента главной страницы:
+INDEX = 'feed:index'
+
+
+def author_tag(author_id):
+    """Посты автора: его профиль."""
+    return f'author:{author_id}'
+
+
+def group_tag(slug):
+    return f'group:{slug}'
+
+
+def feed_cache_key(request, tags):
+    """Ключ страницы ленты: лента, страница или курсор и поколения
+    тегов, от которых она зависит.
+
+    Страницы из реплики кэшируются отдельно: отставшая реплика
+    не должна подсунуть старую страницу тем, кто читает из default.
+    """
+    position = '{}|{}'.format(
+        request.GET.get('page', ''), request.GET.get('cursor', '')
+    )
+    digest = hashlib.md5(position.encode()).hexdigest()
+    key = invalidation.tagged_key(f'feed:{tags[0]}:{digest}', tags)
+    replica = routers.read_alias()
+    return f'{key}@{replica}' if replica else key
+
+
+def get_feed_page(request, tags, build):
+    """Отдает страницу ленты из кэша, при промахе строит ее через build.
+
+    Одновременные промахи по странице ждут одного строителя,
+    см. core.caching.fetch.
+    """
+    key = feed_cache_key(request, tags)
+
+    def compute():
+        page_obj = build()
+        page_obj.object_list = list(page_obj.object_list)
+        return page_obj
+
+    timeout = settings.FEED_CACHE_TIMEOUT
+    grace = None
+    if routers.read_alias():
+        # Версия могла сдвинуться раньше, чем запись дошла до реплики:
+        # такую страницу нельзя ни держать долго, ни отдавать черствой.
+        timeout = min(timeout, settings.REPLICA_STICKY_SECONDS)
+        grace = 0
+    page_obj = caching.fetch(key, compute, timeout, grace)
+    page_obj.cache_key = key
+    return page_obj
+
+
+def card_key(post, preset):
+    """Ключ карточки поста: отпечаток всего, что в нее выводится.
+
+    Правка поста, имени автора, группы или картинки дает новый ключ,
+    старая карточка доживает в кэше до вытеснения.
+    """
+    author = post.author
+    fingerprint = '|'.join(map(str, (
+        post.text, post.pub_date.isoformat(), post.image.name,
+        author.username, author.get_full_name(),
+        post.group.slug if post.group_id else '',
+    )))
+    digest = hashlib.md5(fingerprint.encode()).hexdigest()
+    return f'post_card:{preset}:{post.pk}:{digest}'
+
+
+def render_cards(posts, preset):
+    """Карточки постов: из кэша одним get_many, недостающие рендерятся
+    шаблоном CARD_TEMPLATE, им же одним запросом достаются миниатюры.
+
+    Карточка поста с картинкой, но без миниатюры (sorl не смог ее
+    сделать) не кэшируется: иначе картинка пропала бы на весь
+    POST_CARD_TIMEOUT.
+    """
+    posts = list(posts)
+    keys = [card_key(post, preset) for post in posts]
+    cards = cache.get_many(keys)
+    missing = [post for post, key in zip(posts, keys) if key not in cards]
+    if missing:
+        thumbnails.prefetch(missing, preset)
+        template = loader.get_template(CARD_TEMPLATE)
+        rendered = {}
+        for post in missing:
+            key = card_key(post, preset)
+            cards[key] = template.render({'post': post, 'preset': preset})
+            if not post.image or post.thumbnails.get(preset):
+                rendered[key] = cards[key]
+        cache.set_many(rendered, settings.POST_CARD_TIMEOUT)
+    return [mark_safe(cards[key]) for key in keys]
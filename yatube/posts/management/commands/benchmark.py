@@ -0,0 +1,267 @@
+import json
+import math
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from core import memory
+from core.queries import QueryRecorder
+from posts.models import Group, Post, User
+from posts.seeding import seed
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+
+def parse_size(value):
+    """Размер набора данных: 10k, 100k, 1m или просто число постов."""
+    value = value.lower()
+    if value in SIZES:
+        return SIZES[value]
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(value[-1:], 1)
+    try:
+        return int(value.rstrip('km')) * multiplier
+    except ValueError:
+        raise CommandError(f'Непонятный размер: {value}')
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def scenarios(author, reader, group, post):
+    """Измеряемые запросы: имя, пользователь, метод, адрес, данные."""
+    return [
+        ('index', None, 'get', reverse('posts:index'), None),
+        ('group_posts', None, 'get',
+         reverse('posts:group_list', args=(group.slug,)), None),
+        ('profile', None, 'get',
+         reverse('posts:profile', args=(author.username,)), None),
+        ('post_detail', None, 'get',
+         reverse('posts:post_detail', args=(post.pk,)), None),
+        ('follow_index', reader, 'get', reverse('posts:follow_index'), None),
+        ('post_create', author, 'post', reverse('posts:post_create'),
+         {'text': 'Пост из бенчмарка'}),
+        ('add_comment', reader, 'post',
+         reverse('posts:add_comment', args=(post.pk,)),
+         {'text': 'Комментарий из бенчмарка'}),
+    ]
+
+
+def growth(before, after):
+    """Относительный рост after над before; с нуля — бесконечный."""
+    if before <= 0:
+        return math.inf if after > 0 else 0.0
+    return after / before - 1
+
+
+def compare(old, new, threshold):
+    """Сравнивает два прогона; возвращает строки отчета и число регрессий.
+
+    Регрессия — рост медианы времени, объема ответа или пика памяти
+    больше чем на threshold, а также любой рост числа запросов.
+    """
+    lines, regressions = [], 0
+    for size, views in new['runs'].items():
+        for view, stats in views.items():
+            before = old['runs'].get(size, {}).get(view)
+            if before is None:
+                continue
+            problems = []
+            change = growth(before['time_median'], stats['time_median'])
+            if change > threshold:
+                problems.append(f'время +{change:.0%}')
+            if stats['queries'] > before['queries']:
+                problems.append(
+                    f'запросы {before["queries"]} → {stats["queries"]}'
+                )
+            change = growth(before['bytes'], stats['bytes'])
+            if change > threshold:
+                problems.append(f'объем +{change:.0%}')
+            if 'peak_bytes' in stats and 'peak_bytes' in before:
+                change = growth(before['peak_bytes'], stats['peak_bytes'])
+                if change > threshold:
+                    problems.append(f'память +{change:.0%}')
+            regressions += bool(problems)
+            lines.append('{:<6} {:<14} {:>9.2f} → {:>9.2f} мс  {}'.format(
+                size, view, before['time_median'], stats['time_median'],
+                ', '.join(problems) or 'ok',
+            ))
+    return lines, regressions
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время, число запросов и объем ответа основных страниц '
+        'на синтетических данных разного размера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', default=['10k'],
+            help='Размеры наборов данных: 10k, 100k, 1m или число постов.',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз замерять каждую страницу.',
+        )
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Не сбрасывать кэш между замерами.',
+        )
+        parser.add_argument(
+            '--memory', action='store_true',
+            help='Замерить пик памяти и места выделений через tracemalloc.',
+        )
+        parser.add_argument(
+            '--data-dir',
+            default=os.path.join(settings.BASE_DIR, 'benchmarks'),
+            help='Где хранить базы с данными; они переиспользуются.',
+        )
+        parser.add_argument(
+            '--output', help='Куда записать результаты в JSON.',
+        )
+        parser.add_argument(
+            '--compare', nargs=2, metavar=('OLD', 'NEW'),
+            help='Сравнить два сохраненных прогона и найти регрессии.',
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.1,
+            help='Допустимый рост времени и объема ответа при сравнении.',
+        )
+
+    def handle(self, *args, **options):
+        if options['compare']:
+            return self.compare(*options['compare'], options['threshold'])
+        setup_test_environment()
+        self.memory = options['memory']
+        os.makedirs(options['data_dir'], exist_ok=True)
+        results = {
+            'meta': {
+                'date': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'repeat': options['repeat'],
+                'warm': options['warm'],
+                'memory': options['memory'],
+            },
+            'runs': {},
+        }
+        for size in options['sizes']:
+            posts = parse_size(size)
+            self.use_database(
+                os.path.join(options['data_dir'], f'posts_{posts}.sqlite3'),
+                posts,
+            )
+            results['runs'][size] = self.run(
+                options['repeat'], options['warm']
+            )
+        report = json.dumps(results, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report)
+        else:
+            self.stdout.write(report)
+
+    def use_database(self, path, posts):
+        """Переключает соединение на базу бенчмарка и заполняет ее."""
+        connection = connections['default']
+        connection.close()
+        connection.settings_dict['NAME'] = path
+        call_command('migrate', verbosity=0)
+        if not Post.objects.exists():
+            self.stderr.write(f'Заполняем {path}: {posts} постов')
+            seed(posts)
+
+    def run(self, repeat, warm):
+        author = User.objects.order_by('-counters__posts_count').first()
+        reader = User.objects.order_by('-counters__following_count').first()
+        group = Group.objects.filter(posts__isnull=False).first()
+        post = Post.objects.order_by('-comments_count').first()
+        results = {}
+        for name, user, method, url, data in scenarios(
+            author, reader, group, post
+        ):
+            # Изменения из post_create и add_comment откатываются, чтобы
+            # повторные прогоны шли на тех же данных.
+            with transaction.atomic():
+                results[name] = self.measure(
+                    name, user, method, url, data, repeat, warm
+                )
+                transaction.set_rollback(True)
+            self.stderr.write('{:<14} {:>9.2f} мс {:>4} запросов'.format(
+                name, results[name]['time_median'], results[name]['queries']
+            ))
+        return results
+
+    def measure(self, name, user, method, url, data, repeat, warm):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        timings, queries = [], []
+        for _ in range(repeat):
+            if not warm:
+                cache.clear()
+            with QueryRecorder() as recorder:
+                started = time.perf_counter()
+                response = getattr(client, method)(url, data)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise CommandError(f'{name}: ответ {response.status_code}')
+            queries.append(len(recorder))
+        stats = {
+            'time_min': min(timings),
+            'time_median': statistics.median(timings),
+            'time_p95': percentile(timings, 0.95),
+            'queries': statistics.median(queries),
+            'bytes': len(response.content),
+        }
+        if self.memory:
+            stats.update(self.measure_memory(client, method, url, data))
+        return stats
+
+    def measure_memory(self, client, method, url, data):
+        """Отдельный прогон под tracemalloc: он искажает время.
+
+        Трассировка, включенная здесь, здесь же и выключается, иначе
+        замедлила бы тайминги следующих страниц.
+        """
+        was_tracing = tracemalloc.is_tracing()
+        memory.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            with memory.traced() as allocated:
+                getattr(client, method)(url, data)
+            return {
+                'peak_bytes': allocated['peak'],
+                'retained_bytes': allocated['retained'],
+                # Где осталась память после запроса: кандидаты в утечки.
+                'top_allocations': memory.top_sites(
+                    tracemalloc.take_snapshot(), 10, base=before
+                ),
+            }
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+
+    def compare(self, old, new, threshold):
+        with open(old) as before, open(new) as after:
+            lines, regressions = compare(
+                json.load(before), json.load(after), threshold
+            )
+        self.stdout.write('\n'.join(lines))
+        if regressions:
+            raise CommandError(f'Найдено регрессий: {regressions}')
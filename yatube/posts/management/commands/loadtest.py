@@ -0,0 +1,282 @@
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.contrib.auth import login
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import (ThreadedWSGIServer,
+                                          WSGIRequestHandler)
+from django.core.signals import got_request_exception
+from django.db import OperationalError
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+from django.utils.module_loading import import_string
+
+from posts.models import Group, Post, User
+
+from .benchmark import percentile
+
+# Доли сценариев по умолчанию; --mix меняет их.
+MIX = {
+    'feed': 40,
+    'group': 10,
+    'profile': 10,
+    'follow_feed': 20,
+    'post': 5,
+    'comment': 10,
+    'follow': 5,
+}
+
+
+def parse_mix(value):
+    """Смесь вида feed=50,post=10 — веса сценариев."""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in MIX:
+            raise CommandError(f'Неизвестный сценарий: {name}')
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise CommandError(f'Непонятный вес: {part}')
+    return mix
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def send(scenario, base, anonymous, session, targets, rng):
+    """Выполняет один запрос сценария и возвращает ответ."""
+    client, token = session
+    if scenario == 'feed':
+        return anonymous.get(base + '/')
+    if scenario == 'group':
+        return anonymous.get(f'{base}/group/{rng.choice(targets["groups"])}/')
+    if scenario == 'profile':
+        return anonymous.get(
+            f'{base}/profile/{rng.choice(targets["authors"])}/'
+        )
+    if scenario == 'follow_feed':
+        return client.get(base + '/follow/')
+    if scenario == 'post':
+        return client.post(base + '/create/', {
+            'text': f'Пост под нагрузкой {rng.random()}',
+            'csrfmiddlewaretoken': token,
+        }, allow_redirects=False)
+    if scenario == 'comment':
+        return client.post(
+            f'{base}/posts/{rng.choice(targets["posts"])}/comment',
+            {'text': 'Комментарий под нагрузкой',
+             'csrfmiddlewaretoken': token},
+            allow_redirects=False,
+        )
+    action = rng.choice(('follow', 'unfollow'))
+    return client.get(
+        f'{base}/profile/{rng.choice(targets["authors"])}/{action}',
+        allow_redirects=False,
+    )
+
+
+def run_thread(base, mix, sessions, targets, deadline, seed):
+    rng = random.Random(seed)
+    anonymous = requests.Session()
+    cookies, token = rng.choice(sessions)
+    client = requests.Session()
+    client.cookies.update(cookies)
+    names, weights = zip(*mix.items())
+    results = []
+    while time.time() < deadline:
+        scenario = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            response = send(
+                scenario, base, anonymous, (client, token), targets, rng
+            )
+            outcome = response.status_code
+        except requests.RequestException as error:
+            outcome = type(error).__name__
+        results.append(
+            (scenario, (time.perf_counter() - started) * 1000, outcome)
+        )
+    return results
+
+
+def run_process(base, mix, sessions, targets, deadline, threads, seed):
+    """Клиентский процесс: threads потоков шлют запросы до deadline."""
+    with ThreadPoolExecutor(threads) as pool:
+        futures = [
+            pool.submit(
+                run_thread, base, mix, sessions, targets, deadline,
+                seed * 1000 + number,
+            )
+            for number in range(threads)
+        ]
+        return [result for future in futures for result in future.result()]
+
+
+def login_session(user):
+    """Cookie вошедшего пользователя и CSRF-токен для его форм."""
+    request = HttpRequest()
+    request.session = import_string(
+        settings.SESSION_ENGINE + '.SessionStore'
+    )()
+    login(request, user, backend=settings.AUTHENTICATION_BACKENDS[0])
+    request.session.save()
+    token = get_token(request)
+    cookies = {
+        settings.SESSION_COOKIE_NAME: request.session.session_key,
+        settings.CSRF_COOKIE_NAME: request.META['CSRF_COOKIE'],
+    }
+    return cookies, token
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест: поднимает сайт на локальном WSGI-сервере '
+        'и гоняет смесь чтений и записей из многих потоков и процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=30)
+        parser.add_argument(
+            '--processes', type=int, default=2,
+            help='Клиентские процессы; сервер работает в основном.',
+        )
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Потоков в каждом клиентском процессе.',
+        )
+        parser.add_argument(
+            '--users', type=int, default=50,
+            help='Сколько пользователей из базы входит на сайт.',
+        )
+        parser.add_argument(
+            '--mix', type=parse_mix, default=MIX,
+            help='Веса сценариев, например feed=50,post=10. '
+                 'Сценарии: ' + ', '.join(MIX),
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Куда записать итоги в JSON.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        sessions, targets = self.prepare(rng, options['users'])
+        errors = Counter()
+        lock = threading.Lock()
+
+        def count_error(sender, **kwargs):
+            # Сигнал шлется из блока except: исключение еще доступно.
+            error = sys.exc_info()[1]
+            if isinstance(error, OperationalError) and 'locked' in str(error):
+                name = 'database is locked'
+            else:
+                name = type(error).__name__
+            with lock:
+                errors[name] += 1
+
+        got_request_exception.connect(count_error)
+        # Ошибки считаются в отчете, трассировки только мешают.
+        request_logger = logging.getLogger('django.request')
+        request_logger.disabled = True
+        httpd = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+        httpd.set_app(import_string(settings.WSGI_APPLICATION))
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        base = 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+        self.stderr.write(f'Сервер {base}, нагрузка {options["duration"]} с')
+        started = time.time()
+        deadline = started + options['duration']
+        try:
+            with ProcessPoolExecutor(options['processes']) as pool:
+                futures = [
+                    pool.submit(
+                        run_process, base, options['mix'], sessions, targets,
+                        deadline, options['threads'],
+                        options['seed'] * 100 + number,
+                    )
+                    for number in range(options['processes'])
+                ]
+                results = [
+                    result for future in futures
+                    for result in future.result()
+                ]
+        finally:
+            httpd.shutdown()
+            got_request_exception.disconnect(count_error)
+            request_logger.disabled = False
+        report = self.report(results, time.time() - started, errors)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+
+    def prepare(self, rng, count):
+        ids = list(User.objects.values_list('pk', flat=True))
+        posts = Post.objects.only('pk').across_shards()
+        if not ids or not posts.count():
+            raise CommandError('База пуста: заполните ее seed_yatube.')
+        users = User.objects.filter(
+            pk__in=rng.sample(ids, min(count, len(ids)))
+        )
+        sessions = [login_session(user) for user in users]
+        targets = {
+            'groups': list(Group.objects.values_list('slug', flat=True)),
+            'authors': list(User.objects.filter(
+                pk__in=rng.sample(ids, min(200, len(ids)))
+            ).values_list('username', flat=True)),
+            'posts': [post.pk for post in posts.order_by('-pk')[:1000]],
+        }
+        if not targets['groups']:
+            targets['groups'] = ['-']
+        return sessions, targets
+
+    def report(self, results, elapsed, errors):
+        by_scenario = defaultdict(list)
+        for scenario, latency, outcome in results:
+            by_scenario[scenario].append((latency, outcome))
+        report = {
+            'duration': elapsed,
+            'requests': len(results),
+            'throughput': len(results) / elapsed,
+            'server_errors': dict(errors),
+            'scenarios': {},
+        }
+        self.stdout.write('{:<12} {:>8} {:>7} {:>8} {:>8} {:>8}'.format(
+            'сценарий', 'запросы', 'ошибки', 'p50', 'p95', 'p99'
+        ))
+        for scenario, rows in sorted(by_scenario.items()):
+            latencies = [latency for latency, _ in rows]
+            failed = sum(
+                1 for _, outcome in rows
+                if not isinstance(outcome, int) or outcome >= 400
+            )
+            stats = {
+                'requests': len(rows),
+                'errors': failed,
+                'error_rate': failed / len(rows),
+                'p50': percentile(latencies, 0.5),
+                'p95': percentile(latencies, 0.95),
+                'p99': percentile(latencies, 0.99),
+            }
+            report['scenarios'][scenario] = stats
+            self.stdout.write(
+                '{:<12} {requests:>8} {errors:>7} {p50:>7.1f}мс '
+                '{p95:>7.1f}мс {p99:>7.1f}мс'.format(scenario, **stats)
+            )
+        self.stdout.write(
+            f'Всего {len(results)} запросов за {elapsed:.1f} с, '
+            f'{report["throughput"]:.1f} в секунду'
+        )
+        locked = errors.get('database is locked', 0)
+        self.stdout.write(
+            f'Ошибки сервера: {sum(errors.values())}, '
+            f'из них database is locked: {locked}'
+        )
+        return report
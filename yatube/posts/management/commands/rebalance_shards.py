@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import sharding
+
+
+class Command(BaseCommand):
+    help = (
+        'Выравнивает число постов в шардах POST_SHARDS, перенося авторов '
+        'целиком; заодно увозит в шарды посты, оставшиеся в default.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tolerance', type=float, default=0.1,
+            help='Допустимая разница шардов в долях средней загрузки.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать план переездов.',
+        )
+
+    def handle(self, *args, **options):
+        if not sharding.is_enabled():
+            raise CommandError('Шарды не настроены: POST_SHARDS пуст.')
+        loads = sharding.author_loads(sharding.sources())
+        moves, load = sharding.plan(
+            loads, settings.POST_SHARDS, options['tolerance']
+        )
+        for author_id, source, target, total in moves:
+            if options['dry_run']:
+                moved = f'{total} постов'
+            else:
+                posts, comments = sharding.move_author(
+                    author_id, source, target
+                )
+                moved = f'{posts} постов, {comments} комментариев'
+            self.stdout.write(f'Автор {author_id}: {source} -> {target}, '
+                              f'{moved}')
+        self.stdout.write('Загрузка шардов: ' + ', '.join(
+            f'{alias} {total}' for alias, total in load.items()
+        ))
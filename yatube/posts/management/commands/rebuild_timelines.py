@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timeline
+from posts.models import User
+
+from .repair_counters import _chunks
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Сколько пользователей обрабатывать за одну транзакцию.',
+        )
+
+    def handle(self, *args, chunk_size, **options):
+        total = 0
+        for ids in _chunks(User.objects, chunk_size):
+            with transaction.atomic():
+                timeline.rebuild(ids)
+            total += len(ids)
+        self.stdout.write(f'Пересобрано лент: {total}')
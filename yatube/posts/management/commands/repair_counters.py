@@ -0,0 +1,110 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts import sharding
+from posts.models import Comment, Follow, Post, User, UserCounters
+
+
+def _totals(queryset, field, ids):
+    rows = queryset.filter(**{f'{field}__in': ids}).order_by().values(
+        field
+    ).annotate(total=Count('pk'))
+    return {row[field]: row['total'] for row in rows}
+
+
+def _chunks(queryset, size):
+    """Первичные ключи queryset порциями по size, без OFFSET."""
+    last_pk = 0
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=last_pk).order_by('pk').values_list(
+                'pk', flat=True
+            )[:size]
+        )
+        if not ids:
+            return
+        yield ids
+        last_pk = ids[-1]
+
+
+class Command(BaseCommand):
+    help = 'Сверяет денормализованные счетчики с данными и чинит их.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько строк проверять за одну транзакцию.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать расхождения, ничего не менять.',
+        )
+
+    def handle(self, *args, chunk_size, dry_run, **options):
+        self.dry_run = dry_run
+        users = sum(
+            self.repair_users(ids) for ids in _chunks(User.objects, chunk_size)
+        )
+        # Посты и комментарии к ним лежат в одной базе: с шардами
+        # каждый шард сверяется сам с собой.
+        posts = sum(
+            self.repair_posts(alias, ids)
+            for alias in sharding.sources()
+            for ids in _chunks(Post.objects.using(alias), chunk_size)
+        )
+        verb = 'Найдено' if dry_run else 'Исправлено'
+        self.stdout.write(
+            f'{verb} расхождений: пользователи — {users}, посты — {posts}'
+        )
+
+    def repair_users(self, ids):
+        posts = {}
+        for alias in sharding.sources():
+            for author_id, total in _totals(
+                Post.objects.using(alias), 'author_id', ids
+            ).items():
+                posts[author_id] = posts.get(author_id, 0) + total
+        with transaction.atomic():
+            followers = _totals(Follow.objects, 'author_id', ids)
+            following = _totals(Follow.objects, 'user_id', ids)
+            stored = UserCounters.objects.select_for_update().in_bulk(ids)
+            missing, broken = [], []
+            for user_id in ids:
+                actual = {
+                    'posts_count': posts.get(user_id, 0),
+                    'followers_count': followers.get(user_id, 0),
+                    'following_count': following.get(user_id, 0),
+                }
+                counters = stored.get(user_id)
+                if counters is None:
+                    missing.append(UserCounters(user_id=user_id, **actual))
+                    continue
+                if any(
+                    getattr(counters, field) != value
+                    for field, value in actual.items()
+                ):
+                    for field, value in actual.items():
+                        setattr(counters, field, value)
+                    broken.append(counters)
+            if not self.dry_run:
+                UserCounters.objects.bulk_create(missing)
+                UserCounters.objects.bulk_update(
+                    broken,
+                    ['posts_count', 'followers_count', 'following_count'],
+                )
+        return len(missing) + len(broken)
+
+    def repair_posts(self, alias, ids):
+        posts = Post.objects.using(alias)
+        with transaction.atomic(using=alias):
+            comments = _totals(Comment.objects.using(alias), 'post_id', ids)
+            broken = []
+            for post in posts.filter(pk__in=ids).only('pk', 'comments_count'):
+                actual = comments.get(post.pk, 0)
+                if post.comments_count != actual:
+                    post.comments_count = actual
+                    broken.append(post)
+            if not self.dry_run:
+                posts.bulk_update(broken, ['comments_count'])
+        return len(broken)
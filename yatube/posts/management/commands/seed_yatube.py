@@ -0,0 +1,83 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts.models import Group, Post, User
+from posts.seeding import BATCH_SIZE, END, Seeder
+
+
+def parse_date(value):
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise CommandError(f'Непонятная дата: {value}')
+    return timezone.make_aware(day, timezone.utc)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет пустую базу синтетическими данными: пользователи, '
+        'группы, посты, комментарии и подписки. Один seed — одни данные.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10_000)
+        parser.add_argument(
+            '--users', type=int,
+            help='Число пользователей; по умолчанию один на 50 постов.',
+        )
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Типичное число подписок одного пользователя.',
+        )
+        parser.add_argument(
+            '--comments', type=float, default=0.3,
+            help='Комментариев в среднем на пост.',
+        )
+        parser.add_argument(
+            '--images', type=float, default=0.0,
+            help='Доля постов с картинками.',
+        )
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument(
+            '--end', type=parse_date, default=END,
+            help='Последний день дат публикации, ГГГГ-ММ-ДД.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--password',
+            help='Пароль всех пользователей; без него войти нельзя.',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, posts, batch_size, **options):
+        # Сидер раздает посты и подписки всем пользователям и группам
+        # базы, а занятые имена пропускает: чужие строки изменили бы
+        # данные одного seed.
+        for model, name in ((Post, 'посты'), (User, 'пользователи'),
+                            (Group, 'группы')):
+            if model.objects.exists():
+                raise CommandError(
+                    f'В базе уже есть {name}, нужна пустая база.'
+                )
+        started = time.monotonic()
+        Seeder(
+            posts,
+            users=options['users'],
+            groups=options['groups'],
+            follows=options['follows'],
+            comments=options['comments'],
+            images=options['images'],
+            seed=options['seed'],
+            password=options['password'],
+            days=options['days'],
+            end=options['end'],
+            batch_size=batch_size,
+            log=self.stdout.write,
+        ).run()
+        self.stdout.write(
+            f'Готово за {time.monotonic() - started:.0f} с'
+        )
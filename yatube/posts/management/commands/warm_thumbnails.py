@@ -0,0 +1,46 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import sharding
+from posts.models import Post
+from posts.thumbnails import generate
+
+
+def _setup_worker():
+    # При запуске процессов через spawn Django нужно поднять заново.
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Нарезает миниатюры всех пресетов для картинок постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов; по умолчанию — по числу ядер.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=16,
+            help='Сколько картинок отдавать процессу за раз.',
+        )
+
+    def handle(self, *args, workers, chunk_size, **options):
+        images = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        # С шардами картинки собираются со всех баз с постами.
+        names = sorted({
+            name for alias in sharding.sources()
+            for name in images.using(alias).iterator()
+        })
+        # Открытые соединения не должны достаться дочерним процессам.
+        connections.close_all()
+        with ProcessPoolExecutor(workers, initializer=_setup_worker) as pool:
+            done = sum(1 for _ in pool.map(
+                generate, names, chunksize=chunk_size
+            ))
+        self.stdout.write(f'Обработано картинок: {done}')
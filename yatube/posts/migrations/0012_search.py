@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.db import migrations
+
+SEARCH_TABLE = 'posts_search'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    posts = apps.get_model('posts', 'Post')._meta.db_table
+    groups = apps.get_model('posts', 'Group')._meta.db_table
+    users = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    group_title = f'(SELECT title FROM {groups} WHERE id = new.group_id)'
+    author_name = (
+        f"(SELECT username || ' ' || first_name || ' ' || last_name "
+        f'FROM {users} WHERE id = new.author_id)'
+    )
+    insert = (
+        f'INSERT INTO {SEARCH_TABLE} (rowid, text, group_title, author_name) '
+        f'VALUES (new.id, new.text, {group_title}, {author_name});'
+    )
+    statements = [
+        f'CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5('
+        f"text, group_title, author_name, tokenize='unicode61')",
+        f'CREATE TRIGGER {SEARCH_TABLE}_post_insert AFTER INSERT ON {posts} '
+        f'BEGIN {insert} END',
+        f'CREATE TRIGGER {SEARCH_TABLE}_post_update '
+        f'AFTER UPDATE OF text, group_id, author_id ON {posts} BEGIN '
+        f'DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id; {insert} END',
+        f'CREATE TRIGGER {SEARCH_TABLE}_post_delete AFTER DELETE ON {posts} '
+        f'BEGIN DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id; END',
+        f'CREATE TRIGGER {SEARCH_TABLE}_group_update '
+        f'AFTER UPDATE OF title ON {groups} BEGIN '
+        f'UPDATE {SEARCH_TABLE} SET group_title = new.title WHERE rowid IN '
+        f'(SELECT id FROM {posts} WHERE group_id = new.id); END',
+        f'CREATE TRIGGER {SEARCH_TABLE}_user_update '
+        f'AFTER UPDATE OF username, first_name, last_name ON {users} BEGIN '
+        f"UPDATE {SEARCH_TABLE} SET author_name = new.username || ' ' || "
+        f"new.first_name || ' ' || new.last_name WHERE rowid IN "
+        f'(SELECT id FROM {posts} WHERE author_id = new.id); END',
+        f'INSERT INTO {SEARCH_TABLE} (rowid, text, group_title, author_name) '
+        f"SELECT p.id, p.text, {group_title.replace('new.', 'p.')}, "
+        f"{author_name.replace('new.', 'p.')} FROM {posts} p",
+    ]
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for trigger in ('post_insert', 'post_update', 'post_delete',
+                    'group_update', 'user_update'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {SEARCH_TABLE}_{trigger}')
+    schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0011_timeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import F
 from django.contrib.auth import get_user_model
 # https://postimg.cc/ZvhVtmgh
 # https://postimg.cc/dDmzsN99
@@ -6,6 +7,83 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 
 
+class ShardedQuerySet(models.QuerySet):
+    """Запросы к моделям, которые живут в шардах (см. posts.sharding).
+
+    Без POST_SHARDS методы ничего не меняют: все строки в default.
+    """
+
+    def related(self, *fields):
+        """select_related, а в шардах — prefetch_related: пользователи
+        и группы живут в default, JOIN с ними в шарде невозможен.
+        Связи глубже первой едут JOIN в запросе своей связи:
+        author__counters — один запрос, а не два."""
+        from . import sharding
+        if not sharding.is_enabled():
+            return self.select_related(*fields)
+        nested = {}
+        for field in fields:
+            name, _, rest = field.partition('__')
+            nested.setdefault(name, [])
+            if rest:
+                nested[name].append(rest)
+        return self.prefetch_related(*(
+            models.Prefetch(
+                name,
+                self.model._meta.get_field(
+                    name
+                ).related_model._default_manager.select_related(*rest),
+            ) if rest else name
+            for name, rest in nested.items()
+        ))
+
+    def create(self, **kwargs):
+        """Без явного .using() шард выбирает роутер по самому объекту."""
+        from . import sharding
+        if self._db is not None or not sharding.is_enabled():
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+
+class PostQuerySet(ShardedQuerySet):
+    def related(self, *fields):
+        return super().related('author', 'group', *fields)
+
+    def for_author(self, author_id):
+        """Посты автора — из одного шарда."""
+        from . import sharding
+        if sharding.is_enabled():
+            self = self.using(sharding.shard_for(author_id))
+        return self.filter(author_id=author_id)
+
+    def for_post(self, post_id):
+        """Один пост — из шарда его автора."""
+        from . import sharding
+        if sharding.is_enabled():
+            self = self.using(sharding.shard_of_post(post_id))
+        return self.filter(pk=post_id)
+
+    def followed_by(self, user):
+        """Посты авторов, на которых подписан user."""
+        from . import sharding
+        if sharding.is_enabled():
+            return self.filter(author_id__in=list(
+                Follow.objects.filter(user=user).values_list(
+                    'author_id', flat=True
+                )
+            ))
+        return self.filter(author__following__user=user)
+
+    def across_shards(self):
+        """Выборка сразу из всех шардов, слитая по порядку сортировки."""
+        from . import sharding
+        if sharding.is_enabled():
+            return sharding.MergedQuerySet(self)
+        return self
+
+
 class Group(models.Model):
 
     title = models.CharField(max_length=200)
@@ -44,13 +122,41 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.IntegerField(
+        verbose_name='Комментариев',
+        default=0,
+        editable=False
+    )
 
     def __str__(self) -> str:
         return self.text[:15]
 
+    objects = PostQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        from . import sharding
+        if self.pk is None:
+            sharding.allocate_id(self)
+        # Счетчики обновляются в post_save — в той же транзакции,
+        # если пост не в шарде.
+        using = kwargs.get('using') or router.db_for_write(
+            Post, instance=self
+        )
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
     class Meta:
         default_related_name = 'posts'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_pub_date_idx'),
+            models.Index(
+                fields=['author', 'pub_date'], name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', 'pub_date'], name='post_group_pub_date_idx'
+            ),
+        ]
 
 
 class Comment(models.Model):
@@ -79,9 +185,23 @@ class Comment(models.Model):
     def __str__(self) -> str:
         return self.text
 
+    objects = ShardedQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(
+            Comment, instance=self
+        )
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
     class Meta:
         ordering = ["-created"]
         default_related_name = "comments"
+        indexes = [
+            models.Index(
+                fields=['post', 'created'], name='comment_post_created_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -98,9 +218,136 @@ class Follow(models.Model):
         verbose_name='Автор'
     )
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'], name='unique_author_user_following'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'
+            ),
+        ]
+
+
+class UserCounters(models.Model):
+    """Денормализованные счетчики пользователя.
+
+    Поддерживаются сигналами при создании и удалении постов и подписок;
+    расхождения находит и чинит команда repair_counters.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.IntegerField(verbose_name='Постов', default=0)
+    followers_count = models.IntegerField(
+        verbose_name='Подписчиков', default=0
+    )
+    following_count = models.IntegerField(verbose_name='Подписок', default=0)
+
+    def __str__(self) -> str:
+        return f'Счетчики {self.user_id}'
+
+    @classmethod
+    def of(cls, user):
+        """Счетчики пользователя; если строки еще нет — нулевые."""
+        try:
+            return user.counters
+        except cls.DoesNotExist:
+            return cls(user=user)
+
+    @classmethod
+    def add(cls, user_id, **deltas):
+        """Атомарно прибавляет deltas к счетчикам пользователя.
+
+        Недостающая строка заводится только при росте счетчиков:
+        при удалении пользователя его строка уже может быть удалена.
+        """
+        changes = {field: F(field) + delta for field, delta in deltas.items()}
+        if cls.objects.filter(user_id=user_id).update(**changes):
+            return
+        if all(delta > 0 for delta in deltas.values()):
+            cls.objects.get_or_create(user_id=user_id)
+            cls.objects.filter(user_id=user_id).update(**changes)
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя.
+
+    Заполняется при публикации поста (fan-out on write), дополняется при
+    подписке и чистится при отписке. Дата публикации скопирована из поста,
+    чтобы страница ленты читалась одним проходом по индексу.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    # Без ограничения в БД: при шардировании поста в default нет.
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+        db_constraint=False,
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_user_post'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date', 'post'],
+                name='timeline_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'], name='timeline_user_author_idx'
+            ),
+        ]
+
+
+class AuthorShard(models.Model):
+    """В каком шарде лежат посты автора (см. posts.sharding)."""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    shard = models.CharField(verbose_name='Шард', max_length=100)
+
+    def __str__(self) -> str:
+        return f'{self.author_id} -> {self.shard}'
+
+
+class PostLocation(models.Model):
+    """Автор поста по его id: по нему находится шард поста."""
+    post_id = models.BigIntegerField(primary_key=True)
+    author_id = models.IntegerField(db_index=True)
+
+
+class IdSequence(models.Model):
+    """Счетчик id, общий для всех шардов."""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
@@ -0,0 +1,131 @@
+import base64
+import binascii
+import json
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_NEXT = 'n'
+CURSOR_PREVIOUS = 'p'
+
+
+def encode_cursor(direction, pub_date, pk):
+    """Упаковывает позицию в ленте в непрозрачный токен для ?cursor=."""
+    raw = json.dumps([direction, pub_date.isoformat(), pk])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен; для испорченного токена возвращает None."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, pub_date, pk = json.loads(raw.decode())
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        return None
+    if direction not in (CURSOR_NEXT, CURSOR_PREVIOUS) or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+def keyset_window(queryset, keys, position, limit):
+    """Выборка до limit строк за позицией курсора.
+
+    queryset упорядочен по убыванию keys. Для курсора назад строки идут
+    в обратном порядке — от позиции к началу ленты.
+    """
+    if position is None:
+        return list(queryset[:limit])
+    direction, pub_date, pk = position
+    date_key, pk_key = keys
+    if direction == CURSOR_NEXT:
+        condition = Q(**{f'{date_key}__lt': pub_date}) | Q(
+            **{date_key: pub_date, f'{pk_key}__lt': pk}
+        )
+    else:
+        queryset = queryset.reverse()
+        condition = Q(**{f'{date_key}__gt': pub_date}) | Q(
+            **{date_key: pub_date, f'{pk_key}__gt': pk}
+        )
+    return list(queryset.filter(condition)[:limit])
+
+
+class PostPaginator(Paginator):
+    """Классический Paginator, который можно положить в кэш.
+
+    При сериализации сохраняются посчитанные count и num_pages,
+    а исходный QuerySet отбрасывается, чтобы pickle его не выполнил.
+    """
+
+    keyset = False
+
+    def __getstate__(self):
+        if not self.keyset:
+            self.num_pages
+        return {**self.__dict__, 'object_list': []}
+
+
+class CursorPaginator(PostPaginator):
+    """Постраничный вывод по ключу (pub_date, id).
+
+    Страница выбирается условием по ключу и LIMIT, поэтому любая страница
+    стоит столько же, сколько первая: без COUNT(*) и без OFFSET.
+    Один экземпляр обслуживает одну страницу — номера страниц условные.
+    """
+
+    keyset = True
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'pk')):
+        self.keys = keys
+        super().__init__(
+            object_list.order_by(*(f'-{key}' for key in keys)), per_page
+        )
+        self._has_next = False
+        self._has_previous = False
+
+    @property
+    def num_pages(self):
+        return self._number + self._has_next
+
+    @property
+    def _number(self):
+        return 2 if self._has_previous else 1
+
+    def _key(self, obj):
+        date_key, pk_key = self.keys
+        return getattr(obj, date_key), getattr(obj, pk_key)
+
+    def _window(self, position, limit):
+        """До limit объектов за позицией в порядке выборки."""
+        return keyset_window(self.object_list, self.keys, position, limit)
+
+    def get_page(self, cursor):
+        """Возвращает страницу по токену; без токена — первую."""
+        position = decode_cursor(cursor)
+        items = self._window(position, self.per_page + 1)
+        more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if position is None:
+            self._has_next = more
+        elif position[0] == CURSOR_NEXT:
+            self._has_previous = True
+            self._has_next = more
+        else:
+            self._has_next = True
+            self._has_previous = more
+            items.reverse()
+        page = self._get_page(items, self._number, self)
+        page.next_cursor = page.previous_cursor = None
+        if items and self._has_next:
+            page.next_cursor = encode_cursor(
+                CURSOR_NEXT, *self._key(items[-1])
+            )
+        if items and self._has_previous:
+            page.previous_cursor = encode_cursor(
+                CURSOR_PREVIOUS, *self._key(items[0])
+            )
+        return page
@@ -0,0 +1,241 @@
+import heapq
+import itertools
+import re
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models.expressions import RawSQL
+
+from . import sharding
+from .models import Group, Post, User
+
+# Виртуальная таблица FTS5: rowid совпадает с id поста.
+SEARCH_TABLE = 'posts_search'
+# Веса колонок text, group_title, author_name для bm25.
+WEIGHTS = (1.0, 0.5, 0.5)
+
+_TERM = re.compile(r'\w+')
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """Переводит ввод пользователя в выражение MATCH.
+
+    Слова берутся как фразы с поиском по префиксу, поэтому кавычки,
+    скобки и операторы FTS5 во вводе не ломают запрос.
+    """
+    terms = _TERM.findall(query)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _fetch(alias, sql, params):
+    with connections[alias].cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def each_index(sql, params):
+    """Строки sql из индекса каждой базы с постами: с шардами —
+    из всех шардов параллельно, без них — из default."""
+    if not sharding.is_enabled():
+        return [_fetch(DEFAULT_DB_ALIAS, sql, params)]
+    return sharding.map_shards(
+        lambda queryset: _fetch(queryset.db, sql, params), Post.objects.all()
+    )
+
+
+def matching_ids(expression):
+    """Подзапрос id найденных постов для фильтра pk__in; с шардами —
+    список id, собранный по их индексам."""
+    sql = f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+    if not sharding.is_enabled():
+        return RawSQL(sql, (expression,))
+    return [
+        row[0] for rows in each_index(sql, [expression]) for row in rows
+    ]
+
+
+def filter_posts(queryset, query):
+    """Сужает queryset до постов, подходящих под запрос."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    if not is_available():
+        return queryset.filter(text__icontains=query)
+    return queryset.filter(pk__in=matching_ids(expression))
+
+
+class SearchResults:
+    """Найденные посты по убыванию релевантности.
+
+    Ведет себя как последовательность, поэтому годится для Paginator:
+    count() считает совпадения в индексе, срез выбирает только
+    нужную страницу и подгружает посты одним запросом.
+    """
+
+    def __init__(self, query, queryset=None):
+        self.expression = match_expression(query)
+        self.query = query
+        if queryset is None:
+            queryset = Post.objects.related().across_shards()
+        self.queryset = queryset
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            if not self.expression:
+                self._count = 0
+            elif not is_available():
+                self._count = filter_posts(self.queryset, self.query).count()
+            else:
+                self._count = sum(rows[0][0] for rows in each_index(
+                    f'SELECT count(*) FROM {SEARCH_TABLE} '
+                    f'WHERE {SEARCH_TABLE} MATCH %s',
+                    [self.expression],
+                ))
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def _ranked_ids(self, offset, limit):
+        # С шардами каждый отдает свои первые offset + limit совпадений,
+        # и они сливаются по bm25, как ленты в MergedQuerySet. Статистика
+        # слов у шардов своя, так что порядок между ними приблизительный.
+        skip = 0 if sharding.is_enabled() else offset
+        parts = each_index(
+            f'SELECT bm25({SEARCH_TABLE}, %s, %s, %s), rowid '
+            f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+            f'ORDER BY 1 LIMIT %s OFFSET %s',
+            [*WEIGHTS, self.expression, offset + limit - skip, skip],
+        )
+        ranked = itertools.islice(
+            heapq.merge(*parts), offset - skip, offset + limit - skip
+        )
+        return [rowid for _, rowid in ranked]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, _ = index.indices(self.count())
+        if start >= stop:
+            return []
+        if not is_available():
+            return list(
+                filter_posts(self.queryset, self.query).order_by(
+                    '-pub_date', '-pk'
+                )[start:stop]
+            )
+        ids = self._ranked_ids(start, stop - start)
+        posts = self.queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def _author_name(row):
+    return (
+        f"(SELECT username || ' ' || first_name || ' ' || last_name "
+        f'FROM {User._meta.db_table} WHERE id = {row}.author_id)'
+    )
+
+
+def _group_title(row):
+    return (
+        f'(SELECT title FROM {Group._meta.db_table} '
+        f'WHERE id = {row}.group_id)'
+    )
+
+
+def author_name(user):
+    return f'{user.username} {user.first_name} {user.last_name}'
+
+
+def _loaded(posts, name, model):
+    """Связанные объекты постов {pk: объект}: уже загруженные берутся
+    как есть, остальные — одним запросом."""
+    field = Post._meta.get_field(name)
+    found = {}
+    for post in posts:
+        related = field.get_cached_value(post, None)
+        if related is not None:
+            found[related.pk] = related
+    wanted = {getattr(post, field.attname) for post in posts}
+    wanted.discard(None)
+    found.update(model.objects.in_bulk(wanted - found.keys()))
+    return found
+
+
+def index_names(alias, posts):
+    """Дописывает в индекс шарда имена авторов и названия групп.
+
+    Триггеры индекса в шарде не видят пользователей и групп — они
+    в default, — и оставляют эти колонки пустыми.
+    """
+    authors = _loaded(posts, 'author', User)
+    groups = _loaded(posts, 'group', Group)
+    with connections[alias].cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {SEARCH_TABLE} SET group_title = %s, author_name = %s '
+            f'WHERE rowid = %s',
+            [
+                (
+                    groups[post.group_id].title if post.group_id else None,
+                    author_name(authors[post.author_id]),
+                    post.pk,
+                )
+                for post in posts
+            ],
+        )
+
+
+def rename(column, value, field, pk):
+    """Новое имя автора или группы в индексах шардов: триггеры
+    на их таблицах срабатывают только в default."""
+    each_index(
+        f'UPDATE {SEARCH_TABLE} SET {column} = %s WHERE rowid IN '
+        f'(SELECT id FROM {Post._meta.db_table} WHERE {field} = %s)',
+        [value, pk],
+    )
+
+
+def _batches(items, size):
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _rebuild(alias):
+    post_table = Post._meta.db_table
+    author = _author_name('p')
+    group = _group_title('p')
+    with transaction.atomic(using=alias):
+        with connections[alias].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} '
+                f'(rowid, text, group_title, author_name) '
+                f'SELECT p.id, p.text, {group}, {author} FROM {post_table} p'
+            )
+        if alias != DEFAULT_DB_ALIAS:
+            posts = Post.objects.using(alias).only('author_id', 'group_id')
+            for batch in _batches(posts.iterator(), sharding.BATCH_SIZE):
+                index_names(alias, batch)
+        with connections[alias].cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) "
+                f"VALUES ('optimize')"
+            )
+            cursor.execute(f'SELECT count(*) FROM {SEARCH_TABLE}')
+            return cursor.fetchone()[0]
+
+
+def rebuild():
+    """Заполняет индекс заново по всем постам; с шардами — индекс
+    каждого шарда."""
+    if not sharding.is_enabled():
+        return _rebuild(DEFAULT_DB_ALIAS)
+    return sum(map(_rebuild, settings.POST_SHARDS))
@@ -0,0 +1,233 @@
+import io
+import random
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from io import StringIO
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from core import invalidation
+
+from . import timeline
+from .cache import INDEX
+from .models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 5000
+# Тексты собираются из заранее придуманных фраз: Faker на каждый
+# из миллиона постов работал бы дольше самой вставки.
+SENTENCES = 5000
+IMAGES = 50
+# Показатель степенного закона для авторов, групп и подписок.
+SKEW = 1.1
+# Последний день дат публикации: от дня запуска данные не зависят.
+END = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def bulk_insert(model, objects, batch_size=BATCH_SIZE):
+    """Вставляет объекты из генератора порциями, не держа их в памяти."""
+    objects = iter(objects)
+    total = 0
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            return total
+        with transaction.atomic():
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+        total += len(batch)
+
+
+@contextmanager
+def explicit_dates(model, name):
+    """Дает bulk_create записать свою дату в поле с auto_now_add."""
+    field = model._meta.get_field(name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Skewed:
+    """Выбор из значений с весами по закону Ципфа: первое значение
+    выпадает чаще всех, хвост — редко."""
+
+    def __init__(self, rng, values, skew=SKEW):
+        self.rng = rng
+        self.values = list(values)
+        self.weights = list(accumulate(
+            1 / rank ** skew for rank in range(1, len(self.values) + 1)
+        ))
+
+    def __call__(self):
+        point = self.rng.random() * self.weights[-1]
+        return self.values[bisect(self.weights, point)]
+
+
+class Seeder:
+    """Генератор синтетических данных, одинаковых для одного seed.
+
+    Посты распределены по авторам по закону Ципфа, подписки образуют
+    граф со степенным распределением подписчиков: на популярных авторов
+    подписываются чаще. Рассчитано на пустую базу; пишет в обход
+    сигналов, поэтому счетчики и ленты подписок пересобираются в конце.
+    """
+
+    def __init__(self, posts, users=None, groups=20, follows=10,
+                 comments=0.3, images=0.0, seed=0, password=None,
+                 days=365, end=END, batch_size=BATCH_SIZE, log=None):
+        self.posts = posts
+        self.users = users or max(posts // 50, 10)
+        self.groups = groups
+        self.follows = follows
+        self.comments = comments
+        self.images = images
+        self.password = password
+        self.days = days
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.rng = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(seed)
+        self.end = end
+
+    def insert(self, model, objects):
+        total = bulk_insert(model, objects, self.batch_size)
+        self.log(f'{model.__name__}: {total}')
+        return total
+
+    def run(self):
+        self.sentences = [
+            self.fake.sentence(nb_words=10) for _ in range(SENTENCES)
+        ]
+        user_ids = self.seed_users()
+        group_ids = self.seed_groups()
+        self.seed_posts(Skewed(self.rng, user_ids), group_ids)
+        self.seed_follows(user_ids)
+        self.seed_comments(user_ids)
+        call_command('repair_counters', stdout=StringIO())
+        with transaction.atomic():
+            self.log(f'TimelineEntry: {timeline.rebuild_all()}')
+        invalidation.invalidate(INDEX)
+
+    def seed_users(self):
+        password = make_password(self.password) if self.password else '!'
+        self.insert(User, (
+            User(
+                username=f'user{number}',
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(),
+                password=password,
+            )
+            for number in range(self.users)
+        ))
+        ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+        # Популярность авторов не должна совпадать с порядком регистрации.
+        self.rng.shuffle(ids)
+        return ids
+
+    def seed_groups(self):
+        self.insert(Group, (
+            Group(
+                title=self.fake.catch_phrase(),
+                slug=f'group-{number}',
+                description=self.fake.paragraph(),
+            )
+            for number in range(self.groups)
+        ))
+        return list(Group.objects.order_by('pk').values_list('pk', flat=True))
+
+    def image_names(self):
+        """Небольшой набор картинок, общий для всех постов с картинками."""
+        names = []
+        for number in range(IMAGES):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            name = f'posts/seed/{number}.jpg'
+            if not default_storage.exists(name):
+                output = io.BytesIO()
+                Image.new('RGB', (960, 540), color).save(output, 'JPEG')
+                default_storage.save(name, ContentFile(output.getvalue()))
+            names.append(name)
+        return names
+
+    def seed_posts(self, authors, group_ids):
+        groups = Skewed(self.rng, group_ids)
+        images = self.image_names() if self.images else []
+        step = timedelta(days=self.days) / self.posts
+        start = self.end - timedelta(days=self.days)
+
+        def post(number):
+            rng = self.rng
+            return Post(
+                text=' '.join(rng.choices(
+                    self.sentences, k=rng.randint(1, 6)
+                )),
+                author_id=authors(),
+                group_id=groups() if rng.random() < 0.75 else None,
+                image=(
+                    rng.choice(images) if rng.random() < self.images else ''
+                ),
+                pub_date=start + step * number,
+            )
+
+        with explicit_dates(Post, 'pub_date'):
+            self.insert(Post, (post(number) for number in range(self.posts)))
+
+    def seed_follows(self, user_ids):
+        authors = Skewed(self.rng, user_ids)
+        limit = len(user_ids) - 1
+
+        def follows(user_id):
+            # Число подписок тоже с тяжелым хвостом: у большинства около
+            # follows, у единиц — в разы больше.
+            count = min(limit, int(
+                self.follows * self.rng.paretovariate(2) / 2
+            ))
+            chosen = set()
+            for _ in range(count * 3):
+                if len(chosen) >= count:
+                    break
+                author_id = authors()
+                if author_id != user_id:
+                    chosen.add(author_id)
+            return (
+                Follow(user_id=user_id, author_id=author_id)
+                for author_id in sorted(chosen)
+            )
+
+        self.insert(Follow, (
+            follow for user_id in user_ids for follow in follows(user_id)
+        ))
+
+    def seed_comments(self, user_ids):
+        authors = Skewed(self.rng, user_ids)
+        post_ids = Post.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        first, last = post_ids['first'], post_ids['last']
+        # Свежие посты обсуждают чаще старых.
+        mean_age = max((last - first) / 10, 1)
+
+        def post_id():
+            return max(first, last - int(self.rng.expovariate(1 / mean_age)))
+
+        self.insert(Comment, (
+            Comment(
+                post_id=post_id(),
+                author_id=authors(),
+                text=self.rng.choice(self.sentences),
+            )
+            for _ in range(int(self.posts * self.comments))
+        ))
+
+
+def seed(posts, **options):
+    """Заполняет пустую базу синтетическими данными на posts постов."""
+    Seeder(posts, **options).run()
@@ -0,0 +1,370 @@
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import (DEFAULT_DB_ALIAS, close_old_connections, connections,
+                       transaction)
+from django.db.models import Count, F, Max
+
+from .models import AuthorShard, Comment, IdSequence, Post, PostLocation
+
+SHARDED_MODELS = (Post, Comment)
+BATCH_SIZE = 500
+
+_executor = None
+
+
+def is_enabled():
+    return bool(settings.POST_SHARDS)
+
+
+def _shard_key(author_id):
+    return f'post_shard:{author_id}'
+
+
+def _post_key(post_id):
+    return f'post_author:{post_id}'
+
+
+def shard_for(author_id, create=False):
+    """Шард автора; с create новый автор закрепляется за шардом.
+
+    create — путь записи: AuthorShard читается мимо кэша. После
+    move_author кэш других процессов еще SHARD_DIRECTORY_TIMEOUT
+    секунд помнит старый шард, и новые строки ушли бы туда.
+    """
+    key = _shard_key(author_id)
+    alias = None if create else cache.get(key)
+    if alias is not None:
+        return alias
+    alias = AuthorShard.objects.filter(author_id=author_id).values_list(
+        'shard', flat=True
+    ).first()
+    if alias is None:
+        alias = settings.POST_SHARDS[author_id % len(settings.POST_SHARDS)]
+        if not create:
+            return alias
+        alias = AuthorShard.objects.get_or_create(
+            author_id=author_id, defaults={'shard': alias}
+        )[0].shard
+    cache.set(key, alias, settings.SHARD_DIRECTORY_TIMEOUT)
+    return alias
+
+
+def shard_of_post(post_id, create=False):
+    """Шард поста: по автору из PostLocation; неизвестный пост — первый
+    шард, где его и не найдут. create — как у shard_for."""
+    author_id = cache.get(_post_key(post_id))
+    if author_id is None:
+        author_id = PostLocation.objects.filter(post_id=post_id).values_list(
+            'author_id', flat=True
+        ).first()
+        if author_id is None:
+            return settings.POST_SHARDS[0]
+        # Автор поста не меняется: запись живет, пока ее не вытеснят.
+        cache.set(_post_key(post_id), author_id, None)
+    return shard_for(author_id, create)
+
+
+def _max_post_id():
+    return max(
+        (maximum or 0 for maximum in map_shards(
+            lambda queryset: queryset.aggregate(Max('pk'))['pk__max'],
+            Post.objects.all(), sources(),
+        )),
+        default=0,
+    )
+
+
+def allocate_id(post):
+    """Выдает новому посту id, общий для всех шардов."""
+    if not is_enabled():
+        return
+    sequence = IdSequence.objects.filter(name='post')
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        if not sequence.update(value=F('value') + 1):
+            # Первый пост после включения шардов: продолжаем id,
+            # уже выданные в базах.
+            IdSequence.objects.create(name='post', value=_max_post_id() + 1)
+        post.pk = sequence.values_list('value', flat=True).get()
+        PostLocation.objects.create(post_id=post.pk, author_id=post.author_id)
+
+
+def sources():
+    """Где могут лежать посты: шарды и default, откуда их еще не увезли."""
+    return list(dict.fromkeys([*settings.POST_SHARDS, DEFAULT_DB_ALIAS]))
+
+
+def _run(func, queryset):
+    close_old_connections()
+    return func(queryset)
+
+
+def map_shards(func, queryset, aliases=None):
+    """Выполняет func(queryset.using(alias)) на всех шардах параллельно."""
+    global _executor
+    aliases = settings.POST_SHARDS if aliases is None else aliases
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.SHARD_WORKERS, thread_name_prefix='shards'
+        )
+    return list(_executor.map(
+        _run,
+        itertools.repeat(func),
+        (queryset.using(alias) for alias in aliases),
+    ))
+
+
+class MergedQuerySet:
+    """Посты из всех шардов как один упорядоченный QuerySet.
+
+    Умеет то, что нужно пагинаторам: filter, order_by, reverse, count,
+    срезы и in_bulk. Для среза [a:b] каждый шард отдает свои первые b
+    строк, а они сливаются heapq.merge по ключам сортировки.
+    """
+
+    ordered = True
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self.model = queryset.model
+
+    def _chain(self, method, *args, **kwargs):
+        return MergedQuerySet(getattr(self.queryset, method)(*args, **kwargs))
+
+    def filter(self, *args, **kwargs):
+        return self._chain('filter', *args, **kwargs)
+
+    def exclude(self, *args, **kwargs):
+        return self._chain('exclude', *args, **kwargs)
+
+    def order_by(self, *fields):
+        return self._chain('order_by', *fields)
+
+    def reverse(self):
+        return self._chain('reverse')
+
+    def _ordering(self):
+        query = self.queryset.query
+        fields = query.order_by or self.model._meta.ordering
+        descending = fields[0].startswith('-')
+        if not query.standard_ordering:
+            descending = not descending
+        names = [field.lstrip('-') for field in fields]
+        if 'pk' not in names and 'id' not in names:
+            names.append('pk')
+        return names, descending
+
+    def _merge(self, limit):
+        names, descending = self._ordering()
+        parts = map_shards(
+            lambda queryset: list(queryset[:limit]), self.queryset
+        )
+        return heapq.merge(
+            *parts,
+            key=lambda obj: tuple(getattr(obj, name) for name in names),
+            reverse=descending,
+        )
+
+    def count(self):
+        return sum(map_shards(lambda queryset: queryset.count(),
+                              self.queryset))
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.stop is None or index.step is not None:
+                raise ValueError('Нужен срез с концом и без шага.')
+            return list(itertools.islice(
+                self._merge(index.stop), index.start, index.stop
+            ))
+        return self[index:index + 1][0]
+
+    def in_bulk(self, ids):
+        found = {}
+        for part in map_shards(
+            lambda queryset: queryset.in_bulk(ids), self.queryset
+        ):
+            found.update(part)
+        return found
+
+
+class ShardRouter:
+    """Посты и комментарии — в шард автора поста, остальное — в default.
+
+    Шард автора записан в AuthorShard: при добавлении шардов авторы
+    не переезжают сами, их переносит manage.py rebalance_shards.
+    Id постов выдает общий счетчик IdSequence, автора поста по id
+    хранит PostLocation. Поиск идет по индексам всех шардов. Админка,
+    реплика и seed_yatube с шардами не работают. Посты и комментарии
+    удаляемого пользователя убирает из шардов delete_author. Без
+    POST_SHARDS роутер ничего не решает.
+    """
+
+    def _sharded_instance(self, hints):
+        instance = hints.get('instance')
+        return instance if isinstance(instance, SHARDED_MODELS) else None
+
+    def db_for_read(self, model, **hints):
+        if not is_enabled():
+            return None
+        instance = self._sharded_instance(hints)
+        if model in SHARDED_MODELS:
+            return instance._state.db if instance is not None else None
+        # Автор и группа поста из шарда все равно читаются из default.
+        return DEFAULT_DB_ALIAS if instance is not None else None
+
+    def db_for_write(self, model, **hints):
+        if not is_enabled():
+            return None
+        if model not in SHARDED_MODELS:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if instance._state.db and not instance._state.adding:
+            return instance._state.db
+        if isinstance(instance, Post):
+            return shard_for(instance.author_id, create=True)
+        post = Comment._meta.get_field('post').get_cached_value(
+            instance, None
+        )
+        if post is not None and post._state.db:
+            return post._state.db
+        return shard_of_post(instance.post_id, create=True)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True if is_enabled() else None
+
+
+def author_loads(aliases):
+    """{автор: (шард, число постов)} по всем базам aliases."""
+    loads = {}
+    counts = map_shards(
+        lambda queryset: list(queryset.values('author_id').annotate(
+            total=Count('pk')
+        ).order_by().values_list('author_id', 'total')),
+        Post.objects.all(), aliases,
+    )
+    for alias, rows in zip(aliases, counts):
+        for author_id, total in rows:
+            loads[author_id] = (alias, total)
+    return loads
+
+
+def plan(loads, shards, tolerance):
+    """Переезды (автор, откуда, куда, постов), выравнивающие шарды.
+
+    Авторы не из шардов раскладываются жадно, самые крупные первыми,
+    в наименее загруженный шард. Затем, пока разница между самым
+    тяжелым и самым легким шардом больше tolerance от средней загрузки,
+    из тяжелого в легкий переезжает самый крупный автор, чей переезд
+    эту разницу уменьшает.
+    """
+    load = dict.fromkeys(shards, 0)
+    placement = {}
+    moves = []
+    homeless = []
+    for author_id, (alias, total) in loads.items():
+        if alias in load:
+            load[alias] += total
+            placement[author_id] = (alias, total)
+        else:
+            homeless.append((total, author_id, alias))
+    for total, author_id, alias in sorted(homeless, reverse=True):
+        target = min(load, key=load.get)
+        moves.append((author_id, alias, target, total))
+        load[target] += total
+        placement[author_id] = (target, total)
+    average = sum(load.values()) / len(load)
+    while True:
+        high = max(load, key=load.get)
+        low = min(load, key=load.get)
+        gap = load[high] - load[low]
+        if gap <= tolerance * average:
+            break
+        candidates = [
+            (total, author_id)
+            for author_id, (alias, total) in placement.items()
+            if alias == high and 0 < total < gap
+        ]
+        if not candidates:
+            break
+        total, author_id = max(
+            candidates, key=lambda candidate: -abs(gap - 2 * candidate[0])
+        )
+        moves.append((author_id, high, low, total))
+        load[high] -= total
+        load[low] += total
+        placement[author_id] = (low, total)
+    return moves, load
+
+
+def move_author(author_id, source, target):
+    """Переносит посты автора и комментарии к ним из source в target.
+
+    Копия пишется в target, потом переключается AuthorShard, потом
+    строки удаляются из source. Записи автора, пришедшие в source
+    во время переноса, потеряются: переносите в тихое время. Новые
+    строки после переноса роутер сверяет с AuthorShard, а чтения
+    в других процессах до SHARD_DIRECTORY_TIMEOUT секунд еще идут
+    в source по кэшу.
+    """
+    from . import search
+    posts = list(Post.objects.using(source).filter(author_id=author_id))
+    comments = list(Comment.objects.using(source).filter(
+        post__author_id=author_id
+    ))
+    for comment in comments:
+        comment.pk = None
+    with transaction.atomic(using=target):
+        Post.objects.using(target).bulk_create(posts, batch_size=BATCH_SIZE)
+        Comment.objects.using(target).bulk_create(
+            comments, batch_size=BATCH_SIZE
+        )
+        if posts and search.is_available():
+            search.index_names(target, posts)
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        PostLocation.objects.bulk_create(
+            (PostLocation(post_id=post.pk, author_id=author_id)
+             for post in posts),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        AuthorShard.objects.update_or_create(
+            author_id=author_id, defaults={'shard': target}
+        )
+    cache.delete(_shard_key(author_id))
+    posts_table = Post._meta.db_table
+    with transaction.atomic(using=source):
+        with connections[source].cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {Comment._meta.db_table} WHERE post_id IN ('
+                f'  SELECT id FROM {posts_table} WHERE author_id = %s'
+                f')',
+                [author_id],
+            )
+            cursor.execute(
+                f'DELETE FROM {posts_table} WHERE author_id = %s',
+                [author_id],
+            )
+    return len(posts), len(comments)
+
+
+def delete_author(author_id):
+    """Удаляет из шардов посты и комментарии пользователя.
+
+    Каскад при удалении пользователя идет только по default: без этого
+    посты удаленного автора остались бы в ленте без автора. Комментарии
+    других пользователей к его постам, как и без шардов, остаются
+    без поста.
+    """
+    for alias in settings.POST_SHARDS:
+        with transaction.atomic(using=alias):
+            Comment.objects.using(alias).filter(author_id=author_id).delete()
+            Post.objects.using(alias).filter(author_id=author_id).delete()
+    PostLocation.objects.filter(author_id=author_id).delete()
@@ -0,0 +1,197 @@
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from core import invalidation
+
+from . import search, sharding, timeline
+from .cache import INDEX, author_tag, group_tag
+from .models import (Comment, Follow, Group, Post, PostLocation, User,
+                     UserCounters)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    """Запоминаем прежнюю группу, чтобы сбросить и ее ленту."""
+    instance._previous_group_id = None
+    if instance.pk:
+        instance._previous_group_id = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', flat=True).first()
+
+
+def _group_slugs(post):
+    slugs = set()
+    if post.group_id:
+        slugs.add(post.group.slug)
+    previous = getattr(post, '_previous_group_id', None)
+    if previous and previous != post.group_id:
+        slugs.update(Group.objects.filter(pk=previous).values_list(
+            'slug', flat=True
+        ))
+    return slugs
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    invalidation.invalidate(
+        INDEX,
+        author_tag(instance.author_id),
+        *map(group_tag, _group_slugs(instance)),
+    )
+
+
+def _feed_tags(field, pk):
+    """Теги лент, где выводятся посты с field = pk: главная, профили
+    их авторов и их группы."""
+    rows = set()
+    for alias in sharding.sources():
+        rows.update(Post.objects.using(alias).filter(**{field: pk}).order_by(
+        ).values_list('author_id', 'group_id').distinct())
+    if not rows:
+        return []
+    authors = {author_id for author_id, _ in rows}
+    groups = {group_id for _, group_id in rows if group_id}
+    slugs = Group.objects.filter(pk__in=groups).values_list('slug', flat=True)
+    return [INDEX, *map(author_tag, authors), *map(group_tag, slugs)]
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_feeds(sender, instance, **kwargs):
+    """После удаления группы ее посты уже без группы: их ленты
+    запоминаем заранее."""
+    instance._feed_tags = _feed_tags('group_id', instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group(sender, instance, created=False, **kwargs):
+    # Название группы есть в карточках ее постов во всех лентах,
+    # у новой группы постов еще нет.
+    if created:
+        tags = []
+    elif hasattr(instance, '_feed_tags'):
+        tags = instance._feed_tags
+    else:
+        tags = _feed_tags('group_id', instance.pk)
+    invalidation.invalidate(group_tag(instance.slug), *tags)
+
+
+# Посты удаленного пользователя сбрасывают свои ленты сами,
+# удаляясь каскадом.
+@receiver(post_save, sender=User)
+def invalidate_user(sender, instance, created, update_fields=None, **kwargs):
+    # Вход на сайт обновляет только last_login — ленты от этого не меняются.
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    # Имя автора есть в карточках его постов во всех лентах.
+    tags = [] if created else _feed_tags('author_id', instance.pk)
+    invalidation.invalidate(author_tag(instance.pk), *tags)
+
+
+@receiver(post_save, sender=User)
+def create_user_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserCounters.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_created_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserCounters.add(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    UserCounters.add(instance.author_id, posts_count=-1)
+
+
+@receiver(post_delete, sender=Post)
+def forget_post_location(sender, instance, **kwargs):
+    if sharding.is_enabled():
+        PostLocation.objects.filter(post_id=instance.pk).delete()
+
+
+@receiver(pre_delete, sender=User)
+def delete_sharded_rows(sender, instance, **kwargs):
+    # Каскад удаления не выходит за пределы default.
+    if sharding.is_enabled():
+        sharding.delete_author(instance.pk)
+
+
+def _add_comments(post_id, delta, using):
+    if post_id:
+        Post.objects.using(using).filter(pk=post_id).update(
+            comments_count=F('comments_count') + delta
+        )
+
+
+@receiver(post_save, sender=Comment)
+def count_created_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _add_comments(instance.post_id, 1, instance._state.db)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    _add_comments(instance.post_id, -1, instance._state.db)
+
+
+@receiver(post_save, sender=Follow)
+def count_created_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserCounters.add(instance.author_id, followers_count=1)
+        UserCounters.add(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    UserCounters.add(instance.author_id, followers_count=-1)
+    UserCounters.add(instance.user_id, following_count=-1)
+
+
+def _indexes_shards():
+    return sharding.is_enabled() and search.is_available()
+
+
+@receiver(post_save, sender=Post)
+def index_post_names(sender, instance, raw=False, **kwargs):
+    if _indexes_shards() and not raw:
+        search.index_names(instance._state.db, [instance])
+
+
+@receiver(post_save, sender=Group)
+def rename_group_in_index(sender, instance, created, raw=False, **kwargs):
+    if _indexes_shards() and not created and not raw:
+        search.rename('group_title', instance.title, 'group_id', instance.pk)
+
+
+@receiver(post_save, sender=User)
+def rename_author_in_index(sender, instance, created, raw=False,
+                           update_fields=None, **kwargs):
+    if not _indexes_shards() or created or raw:
+        return
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    search.rename(
+        'author_name', search.author_name(instance), 'author_id', instance.pk
+    )
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
@@ -0,0 +1,15 @@
+from django import template
+
+from posts.cache import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, preset):
+    """HTML карточек постов с миниатюрами по пресету preset.
+
+    Карточки берутся из кэша одним get_many, рендерятся только
+    недостающие, см. posts.cache.render_cards.
+    """
+    return render_cards(posts or (), preset)
@@ -0,0 +1,21 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post, preset):
+    """Миниатюра картинки поста по пресету из posts.thumbnails.PRESETS.
+
+    Берется из post.thumbnails, если страницу подготовил prefetch;
+    сделанная здесь миниатюра туда же и кладется, см. render_cards.
+    """
+    prefetched = getattr(post, 'thumbnails', {}).get(preset)
+    if prefetched:
+        return prefetched
+    image = thumbnails.thumbnail(post.image, preset)
+    if image and hasattr(post, 'thumbnails'):
+        post.thumbnails[preset] = image
+    return image
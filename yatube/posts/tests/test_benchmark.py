@@ -0,0 +1,135 @@
+import tracemalloc
+from datetime import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Max
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..management.commands.benchmark import (
+    Command as Benchmark, compare, parse_size,
+)
+from ..management.commands.loadtest import login_session, parse_mix
+from ..management.commands.seed_yatube import parse_date
+from ..models import Follow, Group, Post, TimelineEntry, User, UserCounters
+from ..seeding import seed
+
+
+class SeedingTest(TestCase):
+    def test_seed(self):
+        """Синтетические данные согласованы со счетчиками и лентами."""
+        seed(200, users=10, groups=3, follows=3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(User.objects.count(), 10)
+        self.assertEqual(
+            Post.objects.values('pub_date').distinct().count(), 200
+        )
+        self.assertEqual(UserCounters.objects.count(), 10)
+        author = UserCounters.objects.order_by('-posts_count').first()
+        self.assertEqual(
+            author.posts_count, Post.objects.filter(author=author.user).count()
+        )
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+
+    def test_same_seed_same_data(self):
+        def snapshot():
+            return list(Post.objects.order_by('pub_date').values_list(
+                'author__username', 'group__slug', 'text'
+            ))
+
+        seed(100, users=10, groups=3, follows=3, seed=7)
+        first = snapshot()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        seed(100, users=10, groups=3, follows=3, seed=7)
+        self.assertEqual(snapshot(), first)
+
+    def test_command_refuses_filled_database(self):
+        seed(20, users=5, groups=2, follows=2)
+        with self.assertRaises(CommandError):
+            call_command('seed_yatube', posts=10, stdout=StringIO())
+
+    def test_command_refuses_existing_users(self):
+        User.objects.create_user('user0')
+        with self.assertRaises(CommandError):
+            call_command('seed_yatube', posts=10, stdout=StringIO())
+        self.assertFalse(Post.objects.exists())
+
+    def test_dates_do_not_depend_on_today(self):
+        end = datetime(2020, 6, 1, tzinfo=timezone.utc)
+        seed(50, users=5, groups=2, follows=2, end=end, days=30)
+        self.assertLessEqual(
+            Post.objects.aggregate(Max('pub_date'))['pub_date__max'], end
+        )
+        self.assertEqual(parse_date('2020-06-01'), end)
+
+
+class CompareTest(TestCase):
+    def run_with(self, **stats):
+        base = {'time_median': 10.0, 'queries': 3, 'bytes': 1000}
+        return {'runs': {'10k': {'index': {**base, **stats}}}}
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size('10k'), 10_000)
+        self.assertEqual(parse_size('1M'), 1_000_000)
+        self.assertEqual(parse_size('500'), 500)
+
+    def test_regressions(self):
+        """Регрессией считается рост времени, объема или числа запросов."""
+        old = self.run_with()
+        for stats in (
+            {'time_median': 12.0}, {'queries': 4}, {'bytes': 1200},
+        ):
+            with self.subTest(stats=stats):
+                _, regressions = compare(old, self.run_with(**stats), 0.1)
+                self.assertEqual(regressions, 1)
+        _, regressions = compare(old, self.run_with(time_median=10.5), 0.1)
+        self.assertEqual(regressions, 0)
+
+    def test_zero_baseline(self):
+        """Сравнение с нулевой медианой не падает, рост с нуля — регрессия."""
+        old = self.run_with(time_median=0.0)
+        _, regressions = compare(old, self.run_with(time_median=0.0), 0.1)
+        self.assertEqual(regressions, 0)
+        _, regressions = compare(old, self.run_with(), 0.1)
+        self.assertEqual(regressions, 1)
+
+    def test_memory_regression(self):
+        old = self.run_with(peak_bytes=1000)
+        _, regressions = compare(old, self.run_with(peak_bytes=1500), 0.1)
+        self.assertEqual(regressions, 1)
+
+    def test_memory_pass_stops_tracing(self):
+        """Замер памяти не оставляет tracemalloc включенным."""
+        stats = Benchmark().measure_memory(
+            Client(), 'get', reverse('posts:index'), {}
+        )
+        self.assertGreater(stats['peak_bytes'], 0)
+        self.assertFalse(tracemalloc.is_tracing())
+
+
+class LoadTestTest(TestCase):
+    def test_parse_mix(self):
+        self.assertEqual(
+            parse_mix('feed=3,post=1.5'), {'feed': 3.0, 'post': 1.5}
+        )
+        with self.assertRaises(CommandError):
+            parse_mix('unknown=1')
+
+    def test_login_session(self):
+        """Подготовленные cookie дают войти и отправить форму."""
+        user = User.objects.create_user('Author_StasBasov')
+        cookies, token = login_session(user)
+        client = Client(enforce_csrf_checks=True)
+        client.cookies.load(cookies)
+        response = client.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост', 'csrfmiddlewaretoken': token},
+        )
+        self.assertRedirects(
+            response, reverse('posts:profile', args=(user.username,))
+        )
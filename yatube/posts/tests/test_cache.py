@@ -0,0 +1,239 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import invalidation
+
+from ..cache import INDEX, author_tag, card_key, group_tag
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user('Author_StasBasov')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='slug',
+            description='Описание группы',
+        )
+        for i in range(13):
+            Post.objects.create(
+                text=f'Пост номер {i}', author=cls.user, group=cls.group
+            )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_pages_cached_separately(self):
+        """Каждая страница ленты кэшируется под своим ключом."""
+        first = self.guest_client.get(reverse('posts:index'))
+        second = self.guest_client.get(reverse('posts:index') + '?page=2')
+        self.assertEqual(len(first.context['page_obj']), 10)
+        self.assertEqual(len(second.context['page_obj']), 3)
+        self.assertNotEqual(
+            first.context['page_obj'].cache_key,
+            second.context['page_obj'].cache_key,
+        )
+
+    def test_cached_page_skips_post_queries(self):
+        """Повторный запрос страницы не ходит в таблицу постов."""
+        url = reverse('posts:group_list', args=(self.group.slug,))
+        self.guest_client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(url)
+        self.assertEqual(len(response.context['page_obj']), 10)
+        for query in queries.captured_queries:
+            self.assertNotIn('"posts_post"', query['sql'])
+
+    def test_new_post_invalidates_feeds(self):
+        """Новый пост сразу виден в ленте, группе и профиле."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        post = Post.objects.create(
+            text='Свежий пост', author=self.user, group=self.group
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.context['page_obj'][0], post)
+
+    def test_post_moved_to_other_group(self):
+        """Пост, перенесенный в другую группу, пропадает из старой."""
+        url = reverse('posts:group_list', args=(self.group.slug,))
+        first = self.guest_client.get(url).context['page_obj'][0]
+        other = Group.objects.create(title='Другая', slug='other')
+        first.group = other
+        first.save()
+        response = self.guest_client.get(url)
+        self.assertNotIn(first, list(response.context['page_obj']))
+
+    def test_author_rename_invalidates_feeds(self):
+        """Изменение имени автора сбрасывает ленты."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        self.user.first_name = 'Стас'
+        self.user.save()
+        response = self.guest_client.get(url)
+        self.assertEqual(
+            response.context['page_obj'][0].author.first_name, 'Стас'
+        )
+
+    def test_group_rename_invalidates_profile(self):
+        """Название группы в карточках профиля обновляется сразу."""
+        url = reverse('posts:profile', args=(self.user.username,))
+        self.guest_client.get(url)
+        self.group.title = 'Новое название'
+        self.group.save()
+        response = self.guest_client.get(url)
+        self.assertEqual(
+            response.context['page_obj'][0].group.title, 'Новое название'
+        )
+
+
+class InvalidationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('Author')
+        self.reader = User.objects.create_user('Reader')
+        self.group = Group.objects.create(title='Группа', slug='slug')
+        self.post = Post.objects.create(
+            text='Пост', author=self.user, group=self.group
+        )
+
+    def assertInvalidates(self, tag, action):
+        key = invalidation.tagged_key('entry', [tag])
+        action()
+        self.assertNotEqual(invalidation.tagged_key('entry', [tag]), key)
+
+    def test_tagged_key_stable(self):
+        key = invalidation.tagged_key('entry', ['a', 'b'])
+        self.assertEqual(invalidation.tagged_key('entry', ['a', 'b']), key)
+        invalidation.invalidate('c')
+        self.assertEqual(invalidation.tagged_key('entry', ['a', 'b']), key)
+        invalidation.invalidate('b')
+        self.assertNotEqual(invalidation.tagged_key('entry', ['a', 'b']), key)
+
+    def test_signals_invalidate_tags(self):
+        other = Group.objects.create(title='Другая', slug='other')
+
+        def move_post():
+            self.post.group = other
+            self.post.save()
+
+        cases = (
+            (author_tag(self.user.pk), self.post.save),
+            (INDEX, self.post.save),
+            (group_tag('slug'), move_post),
+            (group_tag('other'), self.post.delete),
+            (group_tag('other'), other.save),
+        )
+        for tag, action in cases:
+            with self.subTest(tag=tag):
+                self.assertInvalidates(tag, action)
+
+    def test_renames_invalidate_feeds_with_their_posts(self):
+        """Имя автора и название группы сбрасывают только ленты,
+        где выводятся их посты."""
+        tags = (INDEX, author_tag(self.user.pk), group_tag('slug'))
+
+        def rename_author():
+            self.user.first_name = 'Стас'
+            self.user.save()
+
+        def rename_group():
+            self.group.title = 'Новое название'
+            self.group.save()
+
+        for action in (rename_author, rename_group, self.group.delete):
+            keys = [invalidation.tagged_key('entry', [tag]) for tag in tags]
+            action()
+            for tag, key in zip(tags, keys):
+                with self.subTest(action=action.__name__, tag=tag):
+                    self.assertNotEqual(
+                        invalidation.tagged_key('entry', [tag]), key
+                    )
+
+    def test_new_users_and_groups_keep_feeds(self):
+        """Регистрация и новая группа без постов ленты не сбрасывают,
+        как и правка автора без постов."""
+        tags = [INDEX, author_tag(self.user.pk), group_tag('slug')]
+        key = invalidation.tagged_key('entry', tags)
+        User.objects.create_user('Newcomer')
+        Group.objects.create(title='Новая', slug='new')
+        self.reader.first_name = 'Читатель'
+        self.reader.save()
+        self.assertEqual(invalidation.tagged_key('entry', tags), key)
+
+    def test_comments_and_follows_keep_feeds(self):
+        """Ни комментарии, ни подписки в кэшированные ленты и карточки
+        не выводятся и их не сбрасывают."""
+        tags = [INDEX, author_tag(self.user.pk), group_tag('slug')]
+        key = invalidation.tagged_key('entry', tags)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(invalidation.tagged_key('entry', tags), key)
+
+
+class PostCardCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user('Author')
+        self.group = Group.objects.create(title='Группа', slug='slug')
+        self.post = Post.objects.create(
+            text='Пост', author=self.user, group=self.group
+        )
+
+    def test_cards_shared_across_feeds(self):
+        """Карточки, отрисованные для главной, берет и лента группы."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertTemplateUsed(response, 'includes/post_card.html')
+        response = self.client.get(
+            reverse('posts:group_list', args=(self.group.slug,))
+        )
+        self.assertContains(response, 'Пост')
+        self.assertTemplateNotUsed(response, 'includes/post_card.html')
+
+    def test_card_key_follows_content(self):
+        key = card_key(self.post, 'card')
+        self.assertEqual(card_key(self.post, 'card'), key)
+        self.assertNotEqual(card_key(self.post, 'cover'), key)
+        other = Group.objects.create(title='Другая', slug='other')
+        changes = (
+            ('text', lambda post: setattr(post, 'text', 'Правка')),
+            ('group', lambda post: setattr(post, 'group', other)),
+            ('image', lambda post: setattr(post, 'image', 'posts/new.gif')),
+            ('author', lambda post: setattr(
+                post.author, 'first_name', 'Стас'
+            )),
+        )
+        for name, change in changes:
+            with self.subTest(name=name):
+                post = Post.objects.select_related('author', 'group').get(
+                    pk=self.post.pk
+                )
+                change(post)
+                self.assertNotEqual(card_key(post, 'card'), key)
+
+    def test_author_rename_rerenders_card(self):
+        url = reverse('posts:profile', args=(self.user.username,))
+        self.client.get(url)
+        self.user.first_name = 'Стас'
+        self.user.last_name = 'Басов'
+        self.user.save()
+        self.assertContains(self.client.get(url), 'Стас Басов')
@@ -0,0 +1,82 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import journal
+
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_LOG_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(
+    SLOW_REQUEST_THRESHOLD=0,
+    SLOW_REQUEST_JOURNAL=f'{TEMP_LOG_DIR}/slow.jsonl',
+)
+class SlowRequestJournalTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        journal._journal = None
+        shutil.rmtree(TEMP_LOG_DIR, ignore_errors=True)
+
+    def setUp(self):
+        journal._journal = None
+        self.user = User.objects.create_user('Author_StasBasov')
+        self.post = Post.objects.create(text='Пост', author=self.user)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def read_journal(self):
+        current = journal.get_journal()
+        current.flush()
+        with open(current.path) as lines:
+            return [json.loads(line) for line in lines]
+
+    def test_fast_requests_skipped(self):
+        before = len(self.read_journal())
+        with self.settings(SLOW_REQUEST_THRESHOLD=60):
+            self.client.get(reverse('posts:index'))
+        self.assertEqual(len(self.read_journal()), before)
+
+    def test_entry(self):
+        """В журнале view, параметры, пользователь, SQL и планы."""
+        self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)),
+            {'from': 'feed'},
+        )
+        entry = self.read_journal()[-1]
+        self.assertEqual(entry['view'], 'posts:post_detail')
+        self.assertEqual(entry['params'], {'from': ['feed']})
+        self.assertEqual(entry['kwargs'], {'post_id': self.post.pk})
+        self.assertEqual(entry['user_id'], self.user.pk)
+        self.assertTrue(entry['queries'])
+        plans = [query['plan'] for query in entry['queries']
+                 if query.get('plan')]
+        self.assertTrue(plans)
+        self.assertTrue(any('posts_post' in line for plan in plans
+                            for line in plan))
+
+    def test_sql_params_not_written(self):
+        """SQL пишется без параметров: в них бывают ключи сессий."""
+        self.client.get(reverse('posts:index'))
+        entry = self.read_journal()[-1]
+        self.assertTrue(entry['queries'])
+        for query in entry['queries']:
+            self.assertNotIn('params', query)
+        text = json.dumps(entry, ensure_ascii=False)
+        self.assertNotIn(self.client.session.session_key, text)
+
+    def test_file_per_process(self):
+        self.assertEqual(
+            journal.get_journal().path,
+            f'{TEMP_LOG_DIR}/slow.{os.getpid()}.jsonl',
+        )
@@ -0,0 +1,57 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+
+from core import maintenance
+
+from ..models import Post
+
+User = get_user_model()
+
+
+# Vacuum делает COMMIT, поэтому тестам нужны настоящие транзакции.
+@override_settings(MAINTENANCE_VACUUM_STEP=8, MAINTENANCE_VACUUM_PAUSE=0)
+class MaintenanceTest(TransactionTestCase):
+    def setUp(self):
+        maintenance.enable_incremental_vacuum()
+        author = User.objects.create_user('Author_StasBasov')
+        Post.objects.bulk_create(
+            Post(text='Длинный текст ' * 300, author=author)
+            for _ in range(100)
+        )
+        Post.objects.all().delete()
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA auto_vacuum = NONE')
+            cursor.execute('VACUUM')
+
+    def test_run_returns_free_pages(self):
+        """Проход обслуживания освобождает страницы удаленных постов."""
+        with self.assertLogs('yatube.maintenance', 'INFO') as logs:
+            report = maintenance.run()
+        self.assertIn('свободных', logs.output[0])
+        self.assertEqual(report['before']['auto_vacuum'], 2)
+        self.assertGreater(report['before']['freelist_count'], 0)
+        self.assertEqual(report['after']['freelist_count'], 0)
+        self.assertEqual(
+            report['vacuumed_pages'], report['before']['freelist_count']
+        )
+        self.assertLess(
+            report['after']['page_count'], report['before']['page_count']
+        )
+
+    def test_vacuum_stops_at_budget(self):
+        """Vacuum останавливается, когда истекает отведенное время."""
+        self.assertEqual(maintenance.incremental_vacuum(budget=0), 0)
+        self.assertGreater(maintenance.stats()['freelist_count'], 0)
+
+    def test_command_prints_stats(self):
+        out = StringIO()
+        with self.assertLogs('yatube.maintenance', 'INFO'):
+            call_command('maintain_db', stdout=out)
+        self.assertIn('freelist_count', out.getvalue())
+        self.assertIn('checkpoint', out.getvalue())
@@ -0,0 +1,62 @@
+import tracemalloc
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import memory
+
+from ..models import Post
+
+User = get_user_model()
+
+
+@override_settings(MEMORY_TRACING=True)
+class MemoryTracingTest(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('Staff', is_staff=True)
+        Post.objects.create(text='Пост', author=self.staff)
+        self.client = Client()
+        self.was_tracing = tracemalloc.is_tracing()
+
+    def tearDown(self):
+        if not self.was_tracing:
+            tracemalloc.stop()
+
+    def test_staff_endpoint(self):
+        """Сотрудник видит пики памяти по view и места выделений."""
+        self.client.get(reverse('posts:index'))
+        self.client.force_login(self.staff)
+        data = self.client.get(reverse('memory')).json()
+        self.assertTrue(data['tracing'])
+        index = data['views']['posts:index']
+        self.assertGreaterEqual(index['requests'], 1)
+        self.assertGreater(index['peak_max'], 0)
+        self.assertTrue(data['top'])
+        self.assertIn('site', data['top'][0])
+
+    def test_endpoint_for_staff_only(self):
+        response = self.client.get(reverse('memory'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_traced(self):
+        with memory.traced() as allocated:
+            garbage = [bytearray(1000) for _ in range(100)]
+        self.assertGreaterEqual(allocated['peak'], 100 * 1000)
+        self.assertGreaterEqual(allocated['retained'], 100 * 1000)
+        del garbage
+
+    def test_traced_without_reset_peak(self):
+        """На Python до 3.9 пик сбрасывается перезапуском tracemalloc."""
+        with mock.patch.object(memory, 'tracemalloc', mock.Mock(
+            wraps=tracemalloc, spec=[
+                name for name in dir(tracemalloc) if name != 'reset_peak'
+            ],
+        )):
+            with memory.traced() as allocated:
+                garbage = [bytearray(1000) for _ in range(100)]
+        self.assertTrue(tracemalloc.is_tracing())
+        self.assertGreaterEqual(allocated['peak'], 100 * 1000)
+        self.assertGreaterEqual(allocated['retained'], 100 * 1000)
+        del garbage
@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+
+from ..models import Post
+
+User = get_user_model()
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('Author_StasBasov')
+        Post.objects.create(text='Пост', author=self.user)
+        self.client = Client()
+        metrics.registry.reset()
+        cache.clear()
+
+    def test_server_timing(self):
+        """Ответ сообщает время в БД, шаблонах и кэше."""
+        response = self.client.get(reverse('posts:index'))
+        header = response['Server-Timing']
+        for part in ('db;dur=', 'template;dur=', 'cache;dur=', 'total;dur='):
+            self.assertIn(part, header)
+
+    def test_metrics_endpoint(self):
+        """/metrics выдает гистограммы, запросы к БД и попадания в кэш."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('about:author'))
+        self.client.force_login(User.objects.create_user(
+            'Staff', is_staff=True
+        ))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            body,
+        )
+        self.assertIn(
+            'yatube_requests_total{view="about:author",method="GET",'
+            'status="200"} 1',
+            body,
+        )
+        self.assertIn('yatube_db_queries_total{view="posts:index"}', body)
+        self.assertIn('yatube_cache_lookups_total{result="hit"}', body)
+        self.assertIn('yatube_cache_hit_ratio', body)
+
+    def test_metrics_closed_for_strangers(self):
+        """Адрес клиента ничего не решает: за прокси все приходят
+        с 127.0.0.1."""
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong'
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_cache_hits_counted_once(self):
+        """Попадания get_many не считаются еще раз во вложенных get."""
+        cache.set('key', 1)
+        cache.get_many(['key', 'missing'])
+        self.assertEqual(metrics.registry.cache['hit'], 1)
+        self.assertEqual(metrics.registry.cache['miss'], 1)
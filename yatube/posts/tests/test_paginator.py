@@ -1,5 +1,8 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 # from django import forms
 from ..models import Post, Group
@@ -30,6 +33,9 @@ class PostsPagesTest(TestCase):
         )
 
     def setUp(self):
+        # Посты созданы bulk_create, без сигналов: ленты, закэшированные
+        # другими тестами, сами не сбросятся.
+        cache.clear()
         # Автор поста
         self.author_post = Client()
         self.author_post.force_login(PostsPagesTest.user)
@@ -51,3 +57,50 @@ class PostsPagesTest(TestCase):
         )
         zapisulku = list(Post.objects.filter(group_id=self.group.id)[:10])
         self.assertEqual(list(response.context["page_obj"]), zapisulku)
+
+    def test_cursor_pages_cover_feed(self):
+        """Курсорные страницы проходят всю ленту без повторов."""
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        response = self.author_post.get(reverse('posts:index'))
+        first = list(response.context['page_obj'])
+        next_cursor = response.context['page_obj'].next_cursor
+        self.assertIsNotNone(next_cursor)
+        response = self.author_post.get(
+            reverse('posts:index') + f'?cursor={next_cursor}'
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(first + list(page_obj), expected)
+        self.assertIsNone(page_obj.next_cursor)
+        self.assertTrue(page_obj.has_previous())
+
+    def test_cursor_previous_page(self):
+        """Курсор назад возвращает предыдущую страницу."""
+        response = self.author_post.get(reverse('posts:index'))
+        first = list(response.context['page_obj'])
+        response = self.author_post.get(
+            reverse('posts:index')
+            + f'?cursor={response.context["page_obj"].next_cursor}'
+        )
+        response = self.author_post.get(
+            reverse('posts:index')
+            + f'?cursor={response.context["page_obj"].previous_cursor}'
+        )
+        self.assertEqual(list(response.context['page_obj']), first)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор отдает первую страницу."""
+        response = self.author_post.get(
+            reverse('posts:index') + '?cursor=broken'
+        )
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_cursor_page_without_count(self):
+        """Курсорная страница не выполняет COUNT(*) и OFFSET."""
+        with CaptureQueriesContext(connection) as queries:
+            self.author_post.get(
+                reverse('posts:group_list', args=(self.group.slug,))
+            )
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'])
+            self.assertNotIn('OFFSET', query['sql'])
@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import profiling
+
+User = get_user_model()
+
+TEMP_PROFILER_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(PROFILER_DIR=TEMP_PROFILER_DIR)
+class ProfilerTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_PROFILER_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.staff = User.objects.create_user('Staff', is_staff=True)
+        self.user = User.objects.create_user('Author_StasBasov')
+        self.client = Client()
+
+    def test_staff_parameter(self):
+        """Сотрудник получает профиль с именем view и pid в названии."""
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('posts:index') + '?_profile')
+        name = response['X-Profile']
+        self.assertIn('posts.index', name)
+        self.assertIn(f'-{os.getpid()}-', name)
+        self.assertTrue(
+            os.path.exists(os.path.join(TEMP_PROFILER_DIR, name))
+        )
+
+    def test_parameter_ignored_for_users(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('posts:index') + '?_profile')
+        self.assertFalse(response.has_header('X-Profile'))
+
+    def test_signed_header(self):
+        response = self.client.get(
+            reverse('posts:index'), HTTP_X_PROFILE=profiling.make_token()
+        )
+        self.assertTrue(response.has_header('X-Profile'))
+        response = self.client.get(
+            reverse('posts:index'), HTTP_X_PROFILE='forged'
+        )
+        self.assertFalse(response.has_header('X-Profile'))
+
+    def test_sampler(self):
+        """Сэмплер копит стеки по view и пишет их в формате collapsed."""
+        sampler = profiling.Sampler(interval=1, window=60)
+        sampler.track('posts:index')
+        sampler.sample()
+        sampler.untrack()
+        sampler.sample()
+        with open(sampler.flush()) as collapsed:
+            lines = collapsed.read().splitlines()
+        self.assertEqual(len(lines), 1)
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertTrue(stack.startswith('posts:index;'))
+        self.assertIn('test_sampler (test_profiling.py)', stack)
+        self.assertEqual(count, '1')
+        self.assertIsNone(sampler.flush())
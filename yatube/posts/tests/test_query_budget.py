@@ -0,0 +1,110 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import resolve, reverse
+
+from core.middleware import QueryBudgetExceeded
+from core.queries import QueryRecorder
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(QUERY_INSPECTOR_STRICT=True)
+class QueryBudgetTest(TestCase):
+    """Каждая view укладывается в объявленный бюджет запросов,
+    и число запросов не растет вместе с числом постов на странице."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user('Reader')
+        cls.authors = [
+            User.objects.create_user(f'Author{i}') for i in range(4)
+        ]
+        cls.groups = [
+            Group.objects.create(title=f'Группа {i}', slug=f'slug{i}')
+            for i in range(3)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}',
+                author=cls.authors[i % 4],
+                group=cls.groups[i % 3],
+            )
+            for i in range(12)
+        ]
+        cls.post = cls.posts[-1]
+        for i in range(5):
+            Comment.objects.create(
+                post=cls.post, author=cls.authors[i % 4], text='Комментарий'
+            )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def requests(self):
+        author = self.authors[0].username
+        own_post = Post.objects.create(text='Свой пост', author=self.reader)
+        return [
+            ('get', reverse('posts:index'), None),
+            ('get', reverse('posts:index') + '?page=2', None),
+            ('get', reverse('posts:group_list', args=('slug0',)), None),
+            ('get', reverse('posts:profile', args=(author,)), None),
+            ('get', reverse('posts:profile', args=(author,)) + '?page=1',
+             None),
+            ('get', reverse('posts:post_detail', args=(self.post.pk,)), None),
+            ('get', reverse('posts:follow_index'), None),
+            ('get', reverse('posts:follow_index') + '?page=1', None),
+            ('get', reverse('posts:post_create'), None),
+            ('post', reverse('posts:post_create'), {'text': 'Новый пост'}),
+            ('get', reverse('posts:post_edit', args=(own_post.pk,)), None),
+            ('post', reverse('posts:post_edit', args=(own_post.pk,)),
+             {'text': 'Правка', 'group': self.groups[0].pk}),
+            ('post', reverse('posts:add_comment', args=(self.post.pk,)),
+             {'text': 'Комментарий'}),
+            ('get', reverse('posts:profile_unfollow', args=(author,)), None),
+            ('get', reverse('posts:profile_follow', args=(author,)), None),
+        ]
+
+    def run_request(self, method, url, data):
+        cache.clear()
+        with QueryRecorder() as recorder:
+            getattr(self.client, method)(url, data or {})
+        return recorder
+
+    def test_views_within_budget(self):
+        for method, url, data in self.requests():
+            with self.subTest(method=method, url=url):
+                try:
+                    recorder = self.run_request(method, url, data)
+                except QueryBudgetExceeded as error:
+                    self.fail(error)
+                budget = resolve(url.split('?')[0]).func.query_budget
+                self.assertLessEqual(len(recorder), budget)
+
+    def test_feed_queries_do_not_grow(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=('slug0',)),
+            reverse('posts:profile', args=(self.authors[0].username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+            reverse('posts:follow_index'),
+        ]
+        before = [len(self.run_request('get', url, None)) for url in urls]
+        for i in range(12):
+            Post.objects.create(
+                text=f'Еще пост {i}',
+                author=self.authors[i % 4],
+                group=self.groups[0],
+            )
+            Comment.objects.create(
+                post=self.post, author=self.authors[i % 4], text='Еще'
+            )
+        after = [len(self.run_request('get', url, None)) for url in urls]
+        self.assertEqual(before, after)
@@ -0,0 +1,83 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Полный проход по таблице без индекса: "SCAN posts_post"
+# (в старых версиях SQLite — "SCAN TABLE posts_post").
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\S+$')
+TEMP_SORT = 'TEMP B-TREE'
+
+
+class QueryPlanTest(TestCase):
+    """Запросы страниц идут по индексам, без полных проходов и сортировок."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user('Author_StasBasov')
+        cls.follower = User.objects.create_user('Follower')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='slug',
+            description='Описание группы',
+        )
+        cls.post = Post.objects.create(
+            text='Текст поста', author=cls.user, group=cls.group
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.follower, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.follower, author=cls.user)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.follower)
+        cache.clear()
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexedPlans(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            for step in self.explain(sql):
+                with self.subTest(url=url, sql=sql, step=step):
+                    self.assertNotRegex(step, FULL_SCAN)
+                    self.assertNotIn(TEMP_SORT, step)
+
+    def test_index(self):
+        self.assertIndexedPlans(reverse('posts:index'))
+        self.assertIndexedPlans(reverse('posts:index') + '?page=1')
+
+    def test_group_posts(self):
+        url = reverse('posts:group_list', args=(self.group.slug,))
+        self.assertIndexedPlans(url)
+        self.assertIndexedPlans(url + '?page=1')
+
+    def test_profile(self):
+        url = reverse('posts:profile', args=(self.user.username,))
+        self.assertIndexedPlans(url)
+        self.assertIndexedPlans(url + '?page=1')
+
+    def test_post_detail(self):
+        self.assertIndexedPlans(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+
+    def test_follow_index(self):
+        self.assertIndexedPlans(reverse('posts:follow_index'))
@@ -0,0 +1,96 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import replication
+
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_DB_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+# В тестах реплика — зеркало default, поэтому видно только, через
+# какое соединение шли запросы.
+@override_settings(READ_REPLICA='replica')
+class ReadReplicaTest(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DB_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user('Author_StasBasov')
+        self.post = Post.objects.create(text='Пост', author=self.user)
+        self.client = Client()
+
+    def replica_queries(self, url):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_feeds_read_from_replica(self):
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:profile', args=(self.user.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        ):
+            with self.subTest(url=url):
+                self.assertTrue(self.replica_queries(url))
+        self.assertFalse(self.replica_queries(reverse('posts:search')))
+
+    def test_reads_stick_to_primary_after_write(self):
+        """После записи пользователь читает из default."""
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'}
+        )
+        self.assertIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+        self.assertEqual(
+            response.cookies[settings.REPLICA_STICKY_COOKIE]['max-age'],
+            settings.REPLICA_STICKY_SECONDS,
+        )
+        url = reverse('posts:profile', args=(self.user.username,))
+        self.assertEqual(self.replica_queries(url), 0)
+
+    def test_reads_stick_to_primary_after_follow(self):
+        """Подписка и отписка пишут по GET — и тоже переключают
+        чтения на default."""
+        author = User.objects.create_user('Author_Other')
+        self.client.force_login(self.user)
+        url = reverse('posts:profile', args=(author.username,))
+        self.assertTrue(self.replica_queries(url))
+        for name in ('posts:profile_follow', 'posts:profile_unfollow'):
+            with self.subTest(name=name):
+                self.client.cookies.pop(settings.REPLICA_STICKY_COOKIE, None)
+                response = self.client.get(
+                    reverse(name, args=(author.username,))
+                )
+                self.assertIn(
+                    settings.REPLICA_STICKY_COOKIE, response.cookies
+                )
+                self.assertEqual(self.replica_queries(url), 0)
+
+    def test_replicate_copies_database(self):
+        path = os.path.join(TEMP_DB_DIR, 'replica.sqlite3')
+        self.assertGreater(replication.copy('default', path), 0)
+        replica = sqlite3.connect(path)
+        count = replica.execute('SELECT COUNT(*) FROM posts_post').fetchone()
+        replica.close()
+        self.assertEqual(count, (1,))
+
+    def test_replicate_refuses_same_database(self):
+        with self.assertRaises(ValueError):
+            replication.replicate('default', 'replica')
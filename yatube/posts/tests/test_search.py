@@ -0,0 +1,90 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import search
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            'Author_StasBasov', first_name='Стас'
+        )
+        self.group = Group.objects.create(
+            title='Котики', slug='cats', description='Про котиков'
+        )
+        self.client = Client()
+
+    def found(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_index_follows_posts(self):
+        """Индекс обновляется при создании, правке и удалении поста."""
+        post = Post.objects.create(text='Первый снег', author=self.author)
+        self.assertEqual(self.found('снег'), [post])
+        post.text = 'Весенний дождь'
+        post.save()
+        self.assertEqual(self.found('снег'), [])
+        self.assertEqual(self.found('дожд'), [post])
+        post.delete()
+        self.assertEqual(self.found('дождь'), [])
+
+    def test_group_and_author(self):
+        """Ищутся название группы и имя автора, в том числе после правки."""
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group
+        )
+        self.assertEqual(self.found('котики'), [post])
+        self.assertEqual(self.found('Стас'), [post])
+        self.group.title = 'Собаки'
+        self.group.save()
+        self.author.first_name = 'Петр'
+        self.author.save()
+        self.assertEqual(self.found('собаки петр'), [post])
+        self.assertEqual(self.found('котики'), [])
+
+    def test_ranking_and_pages(self):
+        """Выдача разбита на страницы и отсортирована по релевантности."""
+        for number in range(12):
+            Post.objects.create(text=f'Кот номер {number}', author=self.author)
+        best = Post.objects.create(text='Кот кот кот', author=self.author)
+        response = self.client.get(reverse('posts:search'), {'q': 'кот'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 13)
+        self.assertEqual(page_obj[0], best)
+        self.assertContains(response, '?q=%D0%BA%D0%BE%D1%82&amp;page=2')
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'кот', 'page': 2}
+        )
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_query_syntax_is_escaped(self):
+        """Кавычки и операторы во вводе не ломают запрос."""
+        post = Post.objects.create(text='Пост про NEAR', author=self.author)
+        self.assertEqual(self.found('"near" ('), [post])
+        self.assertEqual(self.found('***'), [])
+
+    def test_admin_uses_index(self):
+        post = Post.objects.create(text='Первый снег', author=self.author)
+        Post.objects.create(text='Весенний дождь', author=self.author)
+        found = search.filter_posts(Post.objects.all(), 'снег')
+        self.assertEqual(list(found), [post])
+        self.assertIn(search.SEARCH_TABLE, str(found.query))
+
+    def test_rebuild_command(self):
+        post = Post.objects.create(text='Первый снег', author=self.author)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.SEARCH_TABLE}')
+        self.assertEqual(self.found('снег'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.assertEqual(self.found('снег'), [post])
@@ -0,0 +1,292 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import resolve, reverse
+
+from core.decorators import budget_of
+from core.middleware import QueryBudgetExceeded
+from core.queries import QueryRecorder
+
+from .. import search, sharding
+from ..models import (
+    AuthorShard, Comment, Follow, Group, Post, PostLocation, UserCounters,
+)
+
+User = get_user_model()
+
+SHARDS = ['shard1', 'shard2']
+
+
+@override_settings(POST_SHARDS=SHARDS)
+class ShardingTest(TransactionTestCase):
+    databases = {'default', *SHARDS}
+
+    def setUp(self):
+        cache.clear()
+        self.first = User.objects.create_user('Author_StasBasov')
+        self.second = User.objects.create_user('Author_Other')
+        AuthorShard.objects.create(author=self.first, shard='shard1')
+        AuthorShard.objects.create(author=self.second, shard='shard2')
+        self.posts = [
+            Post.objects.create(text=f'Пост {number}', author=author)
+            for number, author in enumerate(
+                [self.first, self.second] * 4
+            )
+        ]
+        self.client = Client()
+
+    def test_posts_live_in_author_shard(self):
+        self.assertEqual(
+            Post.objects.using('shard1').filter(author=self.first).count(), 4
+        )
+        self.assertEqual(
+            Post.objects.using('shard2').filter(author=self.second).count(), 4
+        )
+        self.assertFalse(Post.objects.using('default').exists())
+        ids = [post.pk for post in self.posts]
+        self.assertEqual(ids, sorted(set(ids)))
+
+    def test_feeds_merge_shards(self):
+        """Лента собирается из всех шардов по убыванию даты."""
+        newest = list(reversed(self.posts))
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(list(response.context['page_obj']), newest)
+        response = self.client.get(reverse('posts:index'), {'page': 1})
+        self.assertEqual(
+            list(response.context['page_obj']), newest
+        )
+        self.assertEqual(response.context['page_obj'].paginator.count, 8)
+        merged = Post.objects.across_shards()
+        self.assertEqual(merged[2:5], newest[2:5])
+
+    def test_profile_and_post_detail(self):
+        response = self.client.get(
+            reverse('posts:profile', args=(self.second.username,))
+        )
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [post for post in reversed(self.posts)
+             if post.author == self.second],
+        )
+        post = self.posts[1]
+        self.client.force_login(self.first)
+        self.client.post(
+            reverse('posts:add_comment', args=(post.pk,)),
+            {'text': 'Комментарий'},
+        )
+        comment = Comment.objects.using('shard2').get()
+        self.assertEqual(comment.post_id, post.pk)
+        response = self.client.get(
+            reverse('posts:post_detail', args=(post.pk,))
+        )
+        self.assertEqual(response.context['post'].comments_count, 1)
+        self.assertEqual(list(response.context['comments']), [comment])
+
+    @override_settings(QUERY_INSPECTOR_STRICT=True)
+    def test_views_within_sharded_budget(self):
+        """Автор, группа и счетчики в шардах подгружаются отдельными
+        запросами, но view укладываются в бюджет и с холодным кэшем."""
+        Follow.objects.create(user=self.first, author=self.second)
+        Comment.objects.create(
+            post=self.posts[1], author=self.first, text='Комментарий'
+        )
+        self.client.force_login(self.first)
+        profile = reverse('posts:profile', args=(self.second.username,))
+        urls = [
+            reverse('posts:index'),
+            profile,
+            profile + '?page=1',
+            reverse('posts:post_detail', args=(self.posts[1].pk,)),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                try:
+                    with QueryRecorder() as recorder:
+                        self.client.get(url)
+                except QueryBudgetExceeded as error:
+                    self.fail(error)
+                budget = budget_of(resolve(url.split('?')[0]).func)
+                self.assertLessEqual(len(recorder), budget)
+
+    def test_follow_feed(self):
+        Follow.objects.create(user=self.first, author=self.second)
+        self.client.force_login(self.first)
+        expected = [post for post in reversed(self.posts)
+                    if post.author == self.second]
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), expected)
+        response = self.client.get(
+            reverse('posts:follow_index'), {'page': 1}
+        )
+        self.assertEqual(list(response.context['page_obj']), expected)
+
+    def test_rebalance_moves_authors(self):
+        Post.objects.create(text='Еще', author=self.first)
+        Comment.objects.create(
+            post=self.posts[0], author=self.second, text='Комментарий'
+        )
+        third = User.objects.create_user('Author_Third')
+        AuthorShard.objects.create(author=third, shard='shard1')
+        for _ in range(3):
+            Post.objects.create(text='Третий', author=third)
+        out = StringIO()
+        call_command('rebalance_shards', stdout=out)
+        self.assertIn('shard1 -> shard2', out.getvalue())
+        loads = [Post.objects.using(alias).count() for alias in SHARDS]
+        self.assertEqual(loads, [5, 7])
+        moved = AuthorShard.objects.get(author=third).shard
+        self.assertEqual(moved, 'shard2')
+        self.assertEqual(
+            Post.objects.using('shard2').filter(author=third).count(), 3
+        )
+        detail = self.client.get(
+            reverse('posts:post_detail', args=(self.posts[0].pk,))
+        )
+        self.assertEqual(len(detail.context['comments']), 1)
+
+    def test_user_deletion_cleans_shards(self):
+        Comment.objects.create(
+            post=self.posts[1], author=self.first, text='Комментарий'
+        )
+        kept = Comment.objects.create(
+            post=self.posts[0], author=self.second, text='Ответ'
+        )
+        author_id = self.first.pk
+        self.first.delete()
+        for alias in SHARDS:
+            self.assertFalse(
+                Post.objects.using(alias).filter(author_id=author_id).exists()
+            )
+            self.assertFalse(Comment.objects.using(alias).filter(
+                author_id=author_id
+            ).exists())
+        self.assertFalse(
+            PostLocation.objects.filter(author_id=author_id).exists()
+        )
+        kept.refresh_from_db()
+        self.assertIsNone(kept.post_id)
+        self.assertEqual(
+            Post.objects.using('shard2').get(pk=self.posts[1].pk)
+            .comments_count, 0
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 4)
+
+    def test_repair_counters_reads_shards(self):
+        Comment.objects.create(
+            post=self.posts[1], author=self.first, text='Комментарий'
+        )
+        UserCounters.objects.filter(user=self.first).update(posts_count=0)
+        Post.objects.using('shard2').filter(pk=self.posts[1].pk).update(
+            comments_count=0
+        )
+        out = StringIO()
+        call_command('repair_counters', stdout=out)
+        self.assertIn('пользователи — 1, посты — 1', out.getvalue())
+        self.assertEqual(
+            UserCounters.objects.get(user=self.first).posts_count, 4
+        )
+        self.assertEqual(
+            Post.objects.using('shard2').get(pk=self.posts[1].pk)
+            .comments_count, 1
+        )
+
+    def test_warm_thumbnails_reads_shards(self):
+        for alias, post, name in [
+            ('shard1', self.posts[0], 'posts/a.jpg'),
+            ('shard2', self.posts[1], 'posts/b.jpg'),
+        ]:
+            Post.objects.using(alias).filter(pk=post.pk).update(image=name)
+        pool = mock.MagicMock()
+        pool.return_value.__enter__.return_value.map.side_effect = (
+            lambda func, names, chunksize: names
+        )
+        with mock.patch(
+            'posts.management.commands.warm_thumbnails.ProcessPoolExecutor',
+            pool,
+        ):
+            call_command('warm_thumbnails', stdout=StringIO())
+        executor = pool.return_value.__enter__.return_value
+        self.assertEqual(
+            executor.map.call_args[0][1], ['posts/a.jpg', 'posts/b.jpg']
+        )
+
+    def test_writes_ignore_stale_directory_cache(self):
+        """Кэш шардов у каждого процесса свой: после переезда автора
+        соседний процесс еще помнит старый шард, но пишет в новый."""
+        sharding.move_author(self.first.pk, 'shard1', 'shard2')
+        cache.set(sharding._shard_key(self.first.pk), 'shard1')
+        post = Post.objects.create(text='После переезда', author=self.first)
+        Comment.objects.create(
+            post_id=self.posts[0].pk, author=self.second, text='Комментарий'
+        )
+        self.assertEqual(post._state.db, 'shard2')
+        self.assertFalse(Post.objects.using('shard1').exists())
+        self.assertFalse(Comment.objects.using('shard1').exists())
+        self.assertEqual(Comment.objects.using('shard2').count(), 1)
+
+    def found(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return response.context['page_obj']
+
+    def test_search_across_shards(self):
+        """Поиск сливает индексы шардов по релевантности."""
+        best = Post.objects.create(text='Пост пост пост', author=self.second)
+        for author in [self.first, self.second] * 2:
+            Post.objects.create(text='Еще пост', author=author)
+        page_obj = self.found('пост')
+        self.assertEqual(page_obj.paginator.count, 13)
+        self.assertEqual(page_obj[0], best)
+        self.assertEqual(
+            {post.author for post in page_obj}, {self.first, self.second}
+        )
+        rest = page_obj.paginator.page(2)
+        self.assertEqual(len(rest), 3)
+        self.assertEqual(len({*page_obj, *rest}), 13)
+        self.assertEqual(list(self.found('Пост 3')), [self.posts[3]])
+        self.assertEqual(
+            list(search.filter_posts(Post.objects.using('shard1'), '2')),
+            [self.posts[2]],
+        )
+
+    def test_search_names_in_shards(self):
+        """Имена авторов и групп из default попадают в индексы шардов
+        и при создании поста, и после переименования и переезда."""
+        group = Group.objects.create(title='Котики', slug='cats')
+        post = Post.objects.create(
+            text='Текст', author=self.second, group=group
+        )
+        self.assertEqual(list(self.found('котики')), [post])
+        group.title = 'Собаки'
+        group.save()
+        self.second.first_name = 'Петр'
+        self.second.save()
+        self.assertEqual(list(self.found('собаки петр')), [post])
+        sharding.move_author(self.second.pk, 'shard2', 'shard1')
+        self.assertEqual(list(self.found('собаки петр')), [post])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('9', out.getvalue())
+        self.assertEqual(list(self.found('собаки петр')), [post])
+
+
+class PlanTest(TransactionTestCase):
+    def test_plan_places_homeless_and_evens_load(self):
+        loads = {
+            1: ('default', 10),
+            2: ('default', 4),
+            3: ('shard1', 30),
+            4: ('shard1', 6),
+        }
+        moves, load = sharding.plan(loads, SHARDS, 0.1)
+        self.assertEqual(moves[:2], [
+            (1, 'default', 'shard2', 10), (2, 'default', 'shard2', 4),
+        ])
+        self.assertEqual(load, {'shard1': 30, 'shard2': 20})
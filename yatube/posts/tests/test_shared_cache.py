@@ -0,0 +1,129 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from core.backends.cache import SharedMemoryCache
+from core.backends.shm import COMPRESSED, ENTRY
+
+
+def make_cache(path, **options):
+    return SharedMemoryCache(path, {'OPTIONS': options})
+
+
+def increment(path, times):
+    cache = make_cache(path)
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SharedMemoryCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.shm')
+        self.cache = make_cache(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_basic_operations(self):
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertTrue(self.cache.add('other', 2))
+        self.assertEqual(self.cache.get_many(['key', 'other', 'missing']), {
+            'key': {'value': 1}, 'other': 2,
+        })
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('other'))
+
+    def test_incr(self):
+        self.cache.set('counter', 5)
+        self.assertEqual(self.cache.incr('counter', 3), 8)
+        self.assertEqual(self.cache.get('counter'), 8)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_broken_value_is_a_miss(self):
+        """Нераспаковываемая ячейка читается как промах и очищается."""
+        key = self.cache._key('key', None)
+        self.cache._table.set(key, COMPRESSED, b'not zlib', 0.0)
+        self.assertEqual(self.cache.get('key', 'нет'), 'нет')
+        self.assertIsNone(self.cache._table.get(key))
+        self.cache._table.set(key, 0, b'not pickle', 0.0)
+        self.assertIsNone(self.cache.get('key'))
+        self.cache._table.set(key, 0, b'not pickle', 0.0)
+        with self.assertRaises(ValueError):
+            self.cache.incr('key')
+
+    def test_expiration(self):
+        self.cache.set('gone', 1, 0)
+        self.assertIsNone(self.cache.get('gone'))
+        self.assertTrue(self.cache.add('gone', 2))
+        self.cache.set('forever', 1, None)
+        self.assertTrue(self.cache.touch('forever', 0))
+        self.assertIsNone(self.cache.get('forever'))
+
+    def test_large_values(self):
+        """Сжимаемое значение помещается, несжимаемое — нет и не оставляет
+        старого значения."""
+        text = 'пост ' * 20000
+        self.cache.set('text', text)
+        self.assertEqual(self.cache.get('text'), text)
+        self.cache.set('text', os.urandom(20000))
+        self.assertIsNone(self.cache.get('text'))
+
+    def test_lru_eviction(self):
+        """В наборе из двух ячеек вытесняется давно не читанный ключ."""
+        cache = make_cache(
+            os.path.join(self.directory, 'small.shm'),
+            SIZE=2 * 1024, SLOT_SIZE=1024, WAYS=2,
+        )
+        cache.set('first', 1)
+        cache.set('second', 2)
+        cache.get('first')
+        cache.set('third', 3)
+        self.assertEqual(cache.get('first'), 1)
+        self.assertIsNone(cache.get('second'))
+        self.assertEqual(cache.get('third'), 3)
+
+    def test_geometry_change_resets_file(self):
+        """Файл с другой геометрией создается заново, с той же —
+        сохраняет записи."""
+        self.cache.set('key', 1)
+        same = os.path.join(self.directory, 'same.shm')
+        other = os.path.join(self.directory, 'other.shm')
+        shutil.copy(self.path, same)
+        shutil.copy(self.path, other)
+        self.assertEqual(make_cache(same).get('key'), 1)
+        cache = make_cache(other, SLOT_SIZE=ENTRY.size * 10)
+        self.assertIsNone(cache.get('key'))
+
+    def test_shared_between_processes(self):
+        """Процессы видят записи друг друга, incr не теряет прибавок."""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=increment, args=(self.path, 200))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 800)
+
+    def test_benchmark_command(self):
+        output = StringIO()
+        call_command(
+            'cache_benchmark', processes=2, duration=0.2, keys=50,
+            stdout=output,
+        )
+        for name in ('locmem', 'file', 'shared'):
+            self.assertIn(name, output.getvalue())
@@ -0,0 +1,103 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from core.caching import _lock_key, fetch
+
+
+class Counter:
+    def __init__(self, value='значение', delay=0):
+        self.calls = 0
+        self.value = value
+        self.delay = delay
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.value
+
+
+@override_settings(STAMPEDE_BETA=0, STAMPEDE_WAIT_STEP=0.01)
+class FetchTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def stale(self, value, delta=0):
+        cache.set('key', (value, time.time() - 1, delta), 60)
+
+    def test_fresh_value_not_recomputed(self):
+        compute = Counter()
+        self.assertEqual(fetch('key', compute, 60), 'значение')
+        self.assertEqual(fetch('key', compute, 60), 'значение')
+        self.assertEqual(compute.calls, 1)
+
+    def test_stale_value_recomputed_by_lock_holder(self):
+        self.stale('старое')
+        compute = Counter('новое')
+        self.assertEqual(fetch('key', compute, 60), 'новое')
+        self.assertEqual(compute.calls, 1)
+        self.assertIsNone(cache.get(_lock_key('key')))
+
+    def test_stale_value_served_while_recomputed(self):
+        """Пока другой запрос держит блокировку, отдается черствое."""
+        self.stale('старое')
+        cache.add(_lock_key('key'), 'сосед', 10)
+        compute = Counter('новое')
+        self.assertEqual(fetch('key', compute, 60), 'старое')
+        self.assertEqual(compute.calls, 0)
+
+    def test_concurrent_misses_coalesced(self):
+        compute = Counter(delay=0.2)
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(fetch('key', compute, 60))
+            )
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['значение'] * 8)
+        self.assertEqual(compute.calls, 1)
+
+    @override_settings(STAMPEDE_LOCK_TIMEOUT=0.05)
+    def test_abandoned_lock_expires(self):
+        cache.add(_lock_key('key'), 'упавший', 10)
+        compute = Counter()
+        self.assertEqual(fetch('key', compute, 60), 'значение')
+        self.assertEqual(compute.calls, 1)
+
+    def test_early_expiration(self):
+        """Долгий расчет у самого срока пересчитывается заранее."""
+        cache.set('key', ('старое', time.time() + 1, 10), 60)
+        with mock.patch('core.caching.random.random', return_value=0.9):
+            self.assertEqual(fetch('key', Counter(), 60, beta=1), 'значение')
+            self.assertEqual(
+                fetch('key', Counter('новое'), 60, beta=1), 'значение'
+            )
+
+
+class CachedTagTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_fragment_cached(self):
+        template = Template(
+            '{% load caching %}{% cached 60 fragment page %}'
+            '{{ text }}{% endcached %}'
+        )
+        self.assertEqual(
+            template.render(Context({'text': 'первый', 'page': 1})), 'первый'
+        )
+        self.assertEqual(
+            template.render(Context({'text': 'второй', 'page': 1})), 'первый'
+        )
+        self.assertEqual(
+            template.render(Context({'text': 'второй', 'page': 2})), 'второй'
+        )
@@ -0,0 +1,171 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .. import thumbnails
+from ..cache import card_key, render_cards
+from ..views import post_detail
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x02\x00"
+    b"\x01\x00\x80\x00\x00\x00\x00\x00"
+    b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+    b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+    b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+    b"\x0A\x00\x3B"
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailPresetsTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user('Author_StasBasov')
+        self.client = Client()
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def test_upload_generates_all_presets(self):
+        """Загрузка картинки сразу нарезает миниатюры всех пресетов."""
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'
+            ),
+        })
+        post = Post.objects.get()
+        self.assertTrue(post.image)
+        source = default.kvstore.get(ImageFile(post.image))
+        self.assertIsNotNone(source)
+        generated = default.kvstore._get(source.key, identity='thumbnails')
+        self.assertEqual(len(generated), len(thumbnails.PRESETS))
+
+    def test_missing_image_has_no_thumbnail(self):
+        post = Post.objects.create(text='Пост', author=self.user)
+        self.assertIsNone(thumbnails.thumbnail(post.image, 'card'))
+
+    def test_feed_renders_preset(self):
+        """Лента выводит миниатюру пресета card."""
+        post = Post.objects.create(
+            text='Пост',
+            author=self.user,
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'
+            ),
+        )
+        card = thumbnails.thumbnail(post.image, 'card')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, card.url)
+
+    def test_feed_reads_thumbnails_in_one_query(self):
+        """Миниатюры всей страницы достаются из kvstore одним запросом."""
+        posts = [
+            Post.objects.create(
+                text=f'Пост {number}',
+                author=self.user,
+                image=SimpleUploadedFile(
+                    f'small{number}.gif', SMALL_GIF, content_type='image/gif'
+                ),
+            )
+            for number in range(3)
+        ]
+        cards = [thumbnails.thumbnail(post.image, 'card') for post in posts]
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        kvstore = [
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore), 1)
+        for card in cards:
+            self.assertContains(response, card.url)
+
+    def test_detail_reads_thumbnail_in_one_query(self):
+        """Готовая миниатюра на странице поста — один запрос к kvstore."""
+        post = Post.objects.create(
+            text='Пост',
+            author=self.user,
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'
+            ),
+        )
+        card = thumbnails.thumbnail(post.image, 'card')
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('posts:post_detail', args=(post.pk,))
+            )
+        kvstore = [
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore), 1)
+        self.assertLessEqual(len(queries), post_detail.query_budget)
+        self.assertContains(response, card.url)
+
+    def test_card_without_thumbnail_not_cached(self):
+        """Карточка, отрисованная без миниатюры, в кэш не попадает."""
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'
+            ),
+        )
+        with mock.patch.object(
+            thumbnails, 'get_thumbnail', side_effect=OSError
+        ), self.assertLogs('yatube.thumbnails', 'ERROR'):
+            card, = render_cards([post], 'card')
+        self.assertNotIn('<img', card)
+        self.assertIsNone(cache.get(card_key(post, 'card')))
+        card, = render_cards([post], 'card')
+        self.assertIn('<img', card)
+        self.assertEqual(cache.get(card_key(post, 'card')), card)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=2)
+class BackgroundThumbnailsTest(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_pool_starts_after_commit(self):
+        """Нарезка уходит в пул только после коммита и запрос не ждет."""
+        image = SimpleUploadedFile(
+            'small.gif', SMALL_GIF, content_type='image/gif'
+        )
+        post = Post.objects.create(
+            text='Пост', author=User.objects.create_user('Author'),
+            image=image,
+        )
+        executor = mock.Mock()
+        with mock.patch.object(
+            thumbnails, '_get_executor', return_value=executor
+        ):
+            with transaction.atomic():
+                thumbnails.pregenerate(post.image)
+                executor.submit.assert_not_called()
+        executor.submit.assert_called_once_with(
+            thumbnails.generate, post.image.name
+        )
@@ -0,0 +1,95 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import timeline
+from ..models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('Author_StasBasov')
+        self.other = User.objects.create_user('OtherAuthor')
+        self.reader = User.objects.create_user('Reader')
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def follow_page(self, query=''):
+        response = self.client.get(reverse('posts:follow_index') + query)
+        return response.context['page_obj']
+
+    def test_fan_out_on_create(self):
+        """Новый пост попадает в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(list(self.follow_page()), [post])
+
+    def test_backfill_and_prune(self):
+        """Подписка добавляет старые посты автора, отписка убирает их."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.client.get(
+            reverse('posts:profile_follow', args=(self.author.username,))
+        )
+        self.assertEqual(list(self.follow_page()), [post])
+        self.client.get(
+            reverse('posts:profile_unfollow', args=(self.author.username,))
+        )
+        self.assertEqual(list(self.follow_page()), [])
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_cursor_pages(self):
+        """Лента листается курсором и совпадает с ?page=."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.other)
+        for i in range(7):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            Post.objects.create(text=f'Другой пост {i}', author=self.other)
+        first = self.follow_page()
+        second = self.follow_page(f'?cursor={first.next_cursor}')
+        expected = list(self.follow_page('?page=1'))
+        expected += list(self.follow_page('?page=2'))
+        self.assertEqual(list(first) + list(second), expected)
+        self.assertIsNone(second.next_cursor)
+        previous = self.follow_page(f'?cursor={second.previous_cursor}')
+        self.assertEqual(list(previous), list(first))
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_pulled_author_merged_on_read(self):
+        """Посты популярного автора подмешиваются при чтении."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(list(self.follow_page()), [post])
+
+    def test_rebuild_command(self):
+        """Команда восстанавливает ленты по подпискам."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Пост', author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(list(self.follow_page()), [post])
+
+    @override_settings(TIMELINE_BACKFILL=2)
+    def test_rebuild_all_matches_rebuild(self):
+        """Массовая пересборка дает те же ленты, что и пошаговая."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.other)
+        Follow.objects.create(user=self.other, author=self.author)
+        for i in range(3):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            Post.objects.create(text=f'Другой пост {i}', author=self.other)
+        entries = TimelineEntry.objects.order_by('user', 'post').values_list(
+            'user', 'post', 'author', 'pub_date'
+        )
+        timeline.rebuild(User.objects.values_list('pk', flat=True))
+        expected = list(entries)
+        timeline.rebuild_all()
+        self.assertEqual(list(entries), expected)
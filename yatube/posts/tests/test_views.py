@@ -163,9 +163,12 @@ class PostsPagesTest(TestCase):
 
     def test_cache(self):
         response = self.guest_client.get(reverse('posts:index'))
-        Post.objects.get(pk=self.post.id).delete()
         response2 = self.guest_client.get(reverse('posts:index'))
         self.assertEqual(response.content, response2.content)
+        # Удаление поста сбрасывает кэш ленты
+        Post.objects.get(pk=self.post.id).delete()
+        response3 = self.guest_client.get(reverse('posts:index'))
+        self.assertNotEqual(response.content, response3.content)
 
     def test_page_not_found(self):
         response = self.guest_client.get('/xxxx/')
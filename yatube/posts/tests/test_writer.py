@@ -0,0 +1,136 @@
+import shutil
+import tempfile
+import time
+from concurrent.futures import TimeoutError
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from core import writer
+
+from ..models import Follow, Post
+
+User = get_user_model()
+
+TEMP_LOCK_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+# Писатель работает в своем потоке со своим соединением: данные
+# тестов должны быть закоммичены.
+@override_settings(
+    WRITER_ENABLED=True, WRITER_LOCK_FILE=f'{TEMP_LOCK_DIR}/db.lock'
+)
+class WriterTest(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        writer._writer = None
+        shutil.rmtree(TEMP_LOCK_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user('Author_StasBasov')
+        self.author = User.objects.create_user('Author_Other')
+
+    def test_batch_commits_once(self):
+        """Накопившиеся задания идут одной транзакцией, ошибка одного
+        откатывает только его."""
+        thread = writer.Writer(settings.WRITER_LOCK_FILE, 10, 0)
+        first = thread.submit(
+            Post.objects.create, text='Первый', author=self.user
+        )
+        Follow.objects.create(user=self.user, author=self.author)
+        broken = thread.submit(
+            Follow.objects.create, user=self.user, author=self.author
+        )
+        last = thread.submit(
+            Post.objects.create, text='Последний', author=self.user
+        )
+        thread.start()
+        self.assertEqual(first.result(5).text, 'Первый')
+        self.assertEqual(last.result(5).text, 'Последний')
+        with self.assertRaises(IntegrityError):
+            broken.result(5)
+        self.assertEqual(thread.batches, 1)
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_foreign_key_error_fails_only_its_job(self):
+        """Внешние ключи проверяются при COMMIT: пачка повторяется
+        по одному заданию."""
+        thread = writer.Writer(settings.WRITER_LOCK_FILE, 10, 0)
+        good = thread.submit(
+            Follow.objects.create, user=self.user, author=self.author
+        )
+        broken = thread.submit(
+            Follow.objects.create, user=self.user, author_id=0
+        )
+        thread.start()
+        self.assertEqual(good.result(5).author, self.author)
+        with self.assertRaises(IntegrityError):
+            broken.result(5)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_replay_forgets_rolled_back_pk(self):
+        """Повтор save() не переиспользует pk из откатанной транзакции:
+        иначе он перезаписал бы строку, занявшую этот pk."""
+        calls = []
+
+        def other_writer():
+            # Чужая запись, вклинившаяся между откатом и повтором.
+            calls.append(None)
+            if len(calls) > 1:
+                Post.objects.create(text='Чужой', author=self.author)
+
+        thread = writer.Writer(settings.WRITER_LOCK_FILE, 10, 0)
+        post = Post(text='Пост', author=self.user)
+        thread.submit(other_writer)
+        saved = thread.submit(post.save)
+        broken = thread.submit(
+            Follow.objects.create, user=self.user, author_id=0
+        )
+        thread.start()
+        saved.result(5)
+        with self.assertRaises(IntegrityError):
+            broken.result(5)
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            ['Пост', 'Чужой'],
+        )
+
+    @override_settings(WRITER_TIMEOUT=0.05)
+    def test_timeout_cancels_waiting_job(self):
+        """Таймаут сообщается, только если задание не начиналось."""
+        writer._writer = writer.Writer(settings.WRITER_LOCK_FILE, 10, 0)
+        with self.assertRaises(TimeoutError):
+            writer.write(Post.objects.create, text='Пост', author=self.user)
+        writer._writer.start()
+        self.assertEqual(writer.write(Post.objects.count), 0)
+        writer._writer = None
+
+    @override_settings(WRITER_TIMEOUT=0.05)
+    def test_timeout_waits_for_started_job(self):
+        def slow():
+            time.sleep(0.2)
+            return Post.objects.create(text='Пост', author=self.user)
+
+        writer._writer = None
+        post = writer.write(slow)
+        self.assertTrue(Post.objects.filter(pk=post.pk).exists())
+        writer._writer = None
+
+    def test_views_write_through_writer(self):
+        client = Client()
+        client.force_login(self.user)
+        response = client.post(reverse('posts:post_create'), {'text': 'Пост'})
+        self.assertRedirects(
+            response, reverse('posts:profile', args=(self.user.username,))
+        )
+        client.get(reverse('posts:profile_follow', args=(self.author,)))
+        self.assertTrue(Post.objects.filter(text='Пост').exists())
+        self.assertTrue(
+            Follow.objects.filter(user=self.user, author=self.author).exists()
+        )
+        self.assertGreaterEqual(writer.get_writer().jobs, 3)
@@ -0,0 +1,144 @@
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore
+
+from core import metrics
+
+logger = logging.getLogger('yatube.thumbnails')
+
+Preset = namedtuple('Preset', 'geometry options')
+
+# Все размеры картинок постов, которые выводятся в шаблонах.
+PRESETS = {
+    'card': Preset('600x200', {'crop': 'center', 'upscale': True}),
+    'cover': Preset('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+_executor = None
+
+
+def thumbnail(image, preset):
+    """Миниатюра картинки по имени пресета или None, если ее не сделать."""
+    if not image:
+        return None
+    geometry, options = PRESETS[preset]
+    try:
+        with metrics.timed('thumbnail'):
+            return get_thumbnail(image, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось сделать миниатюру %s', image)
+        return None
+
+
+def thumbnail_file(image, preset):
+    """Файл миниатюры, который сделал бы get_thumbnail, без обращений
+    к хранилищу: имя вычисляется так же, как в ThumbnailBackend."""
+    geometry, options = PRESETS[preset]
+    backend = default.backend
+    source = ImageFile(image)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def _get_raw_many(keys):
+    """Значения kvstore sorl для нескольких ключей одним обращением."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    found = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        rows = dict(KVStore.objects.filter(key__in=missing).values_list(
+            'key', 'value'
+        ))
+        # Промахи тоже кэшируем, как это делает сам kvstore.
+        loaded = {key: rows.get(key, EMPTY_VALUE) for key in missing}
+        kvstore.cache.set_many(
+            loaded, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        found.update(loaded)
+    return {
+        key: value for key, value in found.items()
+        if value and value != EMPTY_VALUE
+    }
+
+
+def prefetch(posts, preset):
+    """Достает готовые миниатюры постов одним multi-get.
+
+    Найденное кладется в post.thumbnails, и тег post_thumbnail не ходит
+    в kvstore за каждым постом.
+    """
+    with metrics.timed('thumbnail'):
+        _prefetch(posts, preset)
+
+
+def _prefetch(posts, preset):
+    files = {
+        post.pk: thumbnail_file(post.image, preset)
+        for post in posts if post.image
+    }
+    found = _get_raw_many([add_prefix(file.key) for file in files.values()])
+    for post in posts:
+        post.thumbnails = {}
+        file = files.get(post.pk)
+        value = file and found.get(add_prefix(file.key))
+        if value:
+            post.thumbnails[preset] = deserialize_image_file(value)
+
+
+def generate(name):
+    """Делает миниатюры картинки для всех пресетов."""
+    try:
+        for preset in PRESETS:
+            thumbnail(name, preset)
+    finally:
+        # В рабочих потоках и процессах соединения с БД свои.
+        connections.close_all()
+    return name
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def pregenerate(image):
+    """Ставит нарезку миниатюр загруженной картинки в фоновый пул.
+
+    При THUMBNAIL_WORKERS = 0 миниатюры делаются сразу.
+    """
+    if not image:
+        return
+    if not settings.THUMBNAIL_WORKERS:
+        for preset in PRESETS:
+            thumbnail(image.name, preset)
+        return
+    # Пул ставится после коммита: до него файл может еще откатиться.
+    name = image.name
+    transaction.on_commit(lambda: _get_executor().submit(generate, name))
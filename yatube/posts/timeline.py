@@ -0,0 +1,151 @@
+from django.conf import settings
+from django.db import connection
+
+from .models import Follow, Post, TimelineEntry, UserCounters
+from .paginators import CURSOR_PREVIOUS, CursorPaginator, keyset_window
+
+FEED_ORDERING = ('-pub_date', '-pk')
+BATCH_SIZE = 500
+
+
+def is_pulled(author_id):
+    """Посты популярного автора не раскладываются по лентам подписчиков,
+    а подмешиваются при чтении."""
+    return UserCounters.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def pulled_authors(user):
+    return list(Follow.objects.filter(
+        user=user,
+        author__counters__followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('author_id', flat=True))
+
+
+def _entry(user_id, post):
+    return TimelineEntry(
+        user_id=user_id,
+        post_id=post.pk,
+        author_id=post.author_id,
+        pub_date=post.pub_date,
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_pulled(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True
+    )
+    TimelineEntry.objects.bulk_create(
+        (_entry(user_id, post) for user_id in followers.iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.for_author(author_id).order_by(
+        *FEED_ORDERING
+    ).only('pk', 'author', 'pub_date')[:settings.TIMELINE_BACKFILL]
+    TimelineEntry.objects.bulk_create(
+        (_entry(user_id, post) for post in posts),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild(user_ids):
+    """Собирает ленты пользователей заново по их подпискам."""
+    TimelineEntry.objects.filter(user_id__in=user_ids).delete()
+    follows = Follow.objects.filter(user_id__in=user_ids).values_list(
+        'user_id', 'author_id'
+    )
+    for user_id, author_id in follows.iterator():
+        backfill(user_id, author_id)
+
+
+def rebuild_all():
+    """Собирает все ленты одним INSERT ... SELECT.
+
+    Для массовой загрузки: то же, что rebuild по всем пользователям,
+    но без запроса на каждую подписку. Последние посты каждого автора
+    отбираются оконной функцией.
+    """
+    entries = TimelineEntry._meta.db_table
+    posts = Post._meta.db_table
+    follows = Follow._meta.db_table
+    counters = UserCounters._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {entries}')
+        cursor.execute(
+            f'INSERT INTO {entries} (user_id, post_id, author_id, pub_date) '
+            f'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+            f'FROM {follows} f JOIN ('
+            f'  SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+            f'    PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+            f'  ) AS position FROM {posts}'
+            f') p ON p.author_id = f.author_id '
+            f'WHERE p.position <= %s AND f.author_id NOT IN ('
+            f'  SELECT user_id FROM {counters} WHERE followers_count > %s'
+            f')',
+            [settings.TIMELINE_BACKFILL, settings.TIMELINE_FANOUT_LIMIT],
+        )
+        return cursor.rowcount
+
+
+class TimelinePaginator(CursorPaginator):
+    """Курсорные страницы ленты подписок.
+
+    Основная часть читается из TimelineEntry одним диапазоном индекса
+    (user, pub_date, post); посты популярных авторов берутся по индексу
+    (author, pub_date) и сливаются с ней при чтении.
+    """
+
+    def __init__(self, user, per_page):
+        super().__init__(
+            TimelineEntry.objects.filter(user=user),
+            per_page,
+            keys=('pub_date', 'post_id'),
+        )
+        self.pulled = pulled_authors(user)
+
+    def _key(self, post):
+        return post.pub_date, post.pk
+
+    def _window(self, position, limit):
+        entries = super()._window(position, limit)
+        posts = Post.objects.related().across_shards().in_bulk(
+            [entry.post_id for entry in entries]
+        )
+        items = [posts[entry.post_id] for entry in entries
+                 if entry.post_id in posts]
+        if not self.pulled:
+            return items
+        for author_id in self.pulled:
+            items += keyset_window(
+                Post.objects.for_author(author_id).related().order_by(
+                    *FEED_ORDERING
+                ),
+                ('pub_date', 'pk'),
+                position,
+                limit,
+            )
+        backwards = position is not None and position[0] == CURSOR_PREVIOUS
+        merged = sorted(
+            {post.pk: post for post in items}.values(),
+            key=self._key,
+            reverse=not backwards,
+        )
+        return merged[:limit]
@@ -1,35 +1,57 @@
-from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Post, Group, Comment, Follow, User
+from .models import Post, Group, Follow, User, UserCounters
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.utils.http import urlencode
+from core.decorators import query_budget, read_replica
+from core.writer import write
+from posts.cache import INDEX, author_tag, get_feed_page, group_tag
 from posts.forms import PostForm, CommentForm
+from posts.paginators import CursorPaginator, PostPaginator
+from posts.search import SearchResults
+from posts.thumbnails import prefetch, pregenerate
+from posts.timeline import TimelinePaginator
 
 SELECT_LIMIT = 10
 
 
 def paginator(request, posts, SELECT_LIMIT):
-    paginator = Paginator(posts, SELECT_LIMIT)
+    """Ссылки ?page= обслуживаем по-старому, остальное — по курсору."""
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+    if page_number is not None:
+        return PostPaginator(posts, SELECT_LIMIT).get_page(page_number)
+    cursor = request.GET.get('cursor')
+    return CursorPaginator(posts, SELECT_LIMIT).get_page(cursor)
 
 
+def cached_paginator(request, posts, *tags):
+    """Страница ленты через кэш, зависящая от тегов tags."""
+    return get_feed_page(
+        request, tags, lambda: paginator(request, posts, SELECT_LIMIT)
+    )
+
+
+@query_budget(4)
+@read_replica
 def index(request):
     """Выводим на страницу первые 10 записей постов."""
-    posts = Post.objects.all()
-    page_obj = paginator(request, posts, SELECT_LIMIT)
+    posts = Post.objects.related().across_shards()
+    page_obj = cached_paginator(request, posts, INDEX)
     template = 'posts/index.html'
     context = {
         'page_obj': page_obj,
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
     }
     return render(request, template, context)
 
 
+@query_budget(5)
+@read_replica
 def group_posts(request, slug):
     """Выводим на страницу первые 10 записей групп."""
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = paginator(request, posts, SELECT_LIMIT)
+    posts = Post.objects.filter(group=group).related().across_shards()
+    page_obj = cached_paginator(request, posts, group_tag(group.slug))
     template = 'posts/group_list.html'
     title = f'Записи сообщества: {group.title}'
     context = {
@@ -41,53 +63,79 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@query_budget(6, sharded=9)
+@read_replica
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.select_related('group', 'author')
-    page_obj = paginator(request, posts, SELECT_LIMIT)
-    post_count = posts.count()
-    following = author.following.exists()
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username
+    )
+    posts = Post.objects.for_author(author.pk).related()
+    page_obj = cached_paginator(request, posts, author_tag(author.pk))
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user, author=author
+    ).exists()
     template = 'posts/profile.html'
     context: dict = {
         'author': author,
         'page_obj': page_obj,
-        'post_count': post_count,
+        'counters': UserCounters.of(author),
         'following': following,
     }
     return render(request, template, context)
 
 
+@query_budget(5)
+def search(request):
+    """Поиск по постам: результаты по убыванию релевантности."""
+    query = request.GET.get('q', '').strip()
+    page_obj = PostPaginator(
+        SearchResults(query), SELECT_LIMIT
+    ).get_page(request.GET.get('page'))
+    return render(request, 'posts/search.html', {
+        'query': query,
+        'page_obj': page_obj,
+        'page_prefix': urlencode({'q': query}) + '&',
+    })
+
+
+@query_budget(5, sharded=10)
+@read_replica
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    quantity_post = post.author.posts.count()
-    comments = Comment.objects.filter(post=post)
+    post = get_object_or_404(
+        Post.objects.for_post(post_id).related('author__counters')
+    )
+    prefetch([post], 'card')
+    comments = post.comments.related('author')
     template = 'posts/post_detail.html'
     context = {
         'post': post,
-        'quantity_post': quantity_post,
+        'counters': UserCounters.of(post.author),
         'form': CommentForm(),
         'comments': comments,
     }
     return render(request, template, context)
 
 
+@query_budget(8)
 @login_required
 def post_create(request):
     template = 'posts/post_create.html'
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        write(post.save)
+        pregenerate(post.image)
         return redirect('posts:profile', request.user)
     return render(request, template, {'form': form})
 
 
+@query_budget(9)
 @login_required
 def post_edit(request, post_id):
     template = 'posts/post_create.html'
-    post = get_object_or_404(Post, pk=post_id)
-    if post.author != request.user:
+    post = get_object_or_404(Post.objects.for_post(post_id))
+    if post.author_id != request.user.pk:
         return redirect('posts:post_detail', post_id)
     form = PostForm(
         request.POST or None,
@@ -95,7 +143,9 @@ def post_edit(request, post_id):
         instance=post,
     )
     if form.is_valid():
-        form.save()
+        post = write(form.save)
+        if 'image' in form.changed_data:
+            pregenerate(post.image)
         return redirect('posts:post_detail', post_id)
     context = {
         'post_id': post_id,
@@ -105,36 +155,51 @@ def post_edit(request, post_id):
     return render(request, template, context)
 
 
+@query_budget(7)
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(Post.objects.for_post(post_id))
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        write(comment.save)
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(5)
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
+    """Лента подписок читается из материализованной ленты пользователя."""
+    if 'page' in request.GET:
+        posts = Post.objects.followed_by(
+            request.user
+        ).related().across_shards()
+        page_obj = paginator(request, posts, SELECT_LIMIT)
+    else:
+        page_obj = TimelinePaginator(request.user, SELECT_LIMIT).get_page(
+            request.GET.get('cursor')
+        )
     return render(request, 'posts/follow.html', {
-        'page_obj': paginator(request, posts, SELECT_LIMIT)
+        'page_obj': page_obj
     })
 
 
+@query_budget(14)
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        write(
+            Follow.objects.get_or_create, user=request.user, author=author
+        )
     return redirect('posts:profile', username)
 
 
+@query_budget(8)
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
+    write(Follow.objects.filter(user=request.user, author=author).delete)
     return redirect('posts:profile', username)
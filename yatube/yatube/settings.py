@@ -50,15 +50,94 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.MemoryTracingMiddleware',
+    'core.middleware.SlowRequestMiddleware',
+    'core.middleware.QueryInspectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilerMiddleware',
+    'core.middleware.ReadReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Заголовок Server-Timing и метрики для Prometheus на /metrics.
+METRICS_ENABLED = True
+# /metrics читают сотрудники и Prometheus с заголовком
+# Authorization: Bearer <METRICS_TOKEN>; None — только сотрудники.
+METRICS_TOKEN = None
+
+# Профили запросов: по токену в X-Profile или ?_profile для сотрудников.
+PROFILER_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILER_TOKEN_MAX_AGE = 60 * 60
+# Сэмплирование всех запросов: стеки раз в INTERVAL секунд,
+# файл .collapsed раз в WINDOW секунд.
+PROFILER_SAMPLING = False
+PROFILER_SAMPLE_INTERVAL = 0.005
+PROFILER_SAMPLE_WINDOW = 60
+
+# Пик и остаток памяти по view через tracemalloc; заметно замедляет
+# процесс. FRAMES — глубина стека, сохраняемого для каждого выделения.
+MEMORY_TRACING = False
+MEMORY_TRACE_FRAMES = 1
+
+# Журнал запросов дольше THRESHOLD секунд (None — выключен) с SQL
+# и планами EXPLAIN самых медленных из них, без параметров SQL. Файл
+# ротируется, у каждого процесса свой: slow_requests.<pid>.jsonl.
+SLOW_REQUEST_THRESHOLD = 1.0
+SLOW_REQUEST_JOURNAL = os.path.join(BASE_DIR, 'logs', 'slow_requests.jsonl')
+SLOW_REQUEST_MAX_BYTES = 10 * 1024 * 1024
+SLOW_REQUEST_BACKUPS = 5
+SLOW_REQUEST_EXPLAIN = 3
+SLOW_REQUEST_QUEUE_SIZE = 1000
+
+# Обслуживание SQLite: PRAGMA optimize, incremental vacuum и checkpoint
+# WAL. Раз в INTERVAL секунд в процессе сайта (None — только командой
+# maintain_db). Vacuum освобождает по STEP страниц с паузой PAUSE
+# секунд и не дольше BUDGET секунд за проход. WAL больше
+# CHECKPOINT_BYTES обрезается до нуля.
+MAINTENANCE_INTERVAL = None
+MAINTENANCE_DATABASES = ['default']
+MAINTENANCE_ANALYSIS_LIMIT = 400
+MAINTENANCE_VACUUM_STEP = 256
+MAINTENANCE_VACUUM_PAUSE = 0.05
+MAINTENANCE_VACUUM_BUDGET = 5
+MAINTENANCE_CHECKPOINT_BYTES = 64 * 1024 * 1024
+
+# Записи из view и сессий идут через один поток-писатель на процесс
+# и файловую блокировку между процессами. Писатель объединяет до
+# BATCH_SIZE записей в одну транзакцию, дожидаясь попутчиков не дольше
+# BATCH_WAIT секунд; view ждет COMMIT не дольше TIMEOUT секунд.
+WRITER_ENABLED = False
+WRITER_LOCK_FILE = os.path.join(BASE_DIR, 'db.sqlite3.lock')
+WRITER_BATCH_SIZE = 32
+WRITER_BATCH_WAIT = 0
+WRITER_TIMEOUT = 30
+
+SESSION_ENGINE = 'core.backends.sessions'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'yatube.maintenance': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+# Подсчет запросов к БД и поиск N+1 — только для разработки и тестов.
+QUERY_INSPECTOR_ENABLED = DEBUG
+# Бросать исключение вместо записи в журнал.
+QUERY_INSPECTOR_STRICT = False
+# Сколько одинаковых SELECT за запрос считать признаком N+1.
+QUERY_INSPECTOR_REPEAT_THRESHOLD = 3
+
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
@@ -66,7 +145,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.backends.templates.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -88,11 +167,67 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        # Соединение живет между запросами одного потока.
+        'CONN_MAX_AGE': 60,
+        # PRAGMA по умолчанию — в core.backends.sqlite3.base.PRAGMAS,
+        # OPTIONS['pragmas'] их дополняет.
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    # Копия default для чтения лент, обновляется manage.py replicate.
+    'replica': {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            'pragmas': {'query_only': 'ON'},
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
 }
 
+# Шарды постов: базы с той же схемой, что у default. Внешние ключи
+# на пользователей и группы в них не проверяются — те живут в default.
+DATABASES.update({
+    f'shard{number}': {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db.shard{number}.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            'pragmas': {'foreign_keys': 'OFF'},
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+    for number in (1, 2)
+})
+
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'core.routers.ReplicaRouter',
+]
+
+# Посты и комментарии раскладываются по авторам в эти базы; пустой
+# список — все в default. Реплика для чтения с шардами не работает.
+POST_SHARDS = []
+# Сколько процесс помнит, в каком шарде автор.
+SHARD_DIRECTORY_TIMEOUT = 60
+# Потоки для параллельных запросов ко всем шардам.
+SHARD_WORKERS = 8
+
+# Откуда читать ленты: алиас реплики или None — только из default.
+READ_REPLICA = None
+# Модели каких приложений читаются из реплики.
+REPLICA_APPS = ['posts', 'auth']
+# После записи пользователь столько секунд читает только из default,
+# чтобы видеть свои изменения; должно быть больше отставания реплики.
+REPLICA_STICKY_SECONDS = 10
+REPLICA_STICKY_COOKIE = 'use_primary'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -142,8 +277,41 @@ LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'
 
+# Потоки, в которых после коммита нарезаются миниатюры загруженных
+# картинок; 0 — нарезать сразу в запросе. Фоновый пул пишет в MEDIA_ROOT
+# уже после ответа, поэтому включается на сервере, например 2.
+THUMBNAIL_WORKERS = 0
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.backends.cache.LocMemCache',
     }
 }
+# У каждого воркера gunicorn свой LocMemCache. Общий для воркеров
+# хоста кэш — core.backends.cache.SharedMemoryCache с LOCATION
+# в tmpfs, например '/dev/shm/yatube-cache', и OPTIONS SIZE,
+# SLOT_SIZE и WAYS. Сравнить кэши: manage.py cache_benchmark.
+
+# Страницы лент сбрасываются сигналами при изменении данных,
+# поэтому время жизни можно держать в минутах.
+FEED_CACHE_TIMEOUT = 60 * 5
+
+# Защита от толпы пересчетов (core.caching.fetch): просроченное
+# значение отдается еще GRACE секунд, пока его пересчитывает один
+# запрос. Остальные промахи ждут его не дольше LOCK_TIMEOUT секунд,
+# проверяя кэш раз в WAIT_STEP секунд. BETA — насколько раньше срока
+# XFetch начинает пересчет (0 — точно в срок).
+STAMPEDE_GRACE = 60
+STAMPEDE_LOCK_TIMEOUT = 10
+STAMPEDE_WAIT_STEP = 0.05
+STAMPEDE_BETA = 1.0
+
+# Карточки постов кэшируются под отпечатком содержимого и после правок
+# не читаются; время жизни только ограничивает память.
+POST_CARD_TIMEOUT = 60 * 60 * 24
+
+# Авторы с большим числом подписчиков не раскладываются по лентам
+# подписок при публикации: их посты подмешиваются при чтении.
+TIMELINE_FANOUT_LIMIT = 10000
+# Сколько последних постов автора добавить в ленту при подписке.
+TIMELINE_BACKFILL = 200
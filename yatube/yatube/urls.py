@@ -18,6 +18,8 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import memory_view, metrics_view
+
 
 urlpatterns = [
     path('auth/', include('users.urls')),
@@ -25,6 +27,8 @@ urlpatterns = [
     path('about/', include('about.urls', namespace='about')),
     path('', include('posts.urls', namespace='posts')),
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
+    path('debug/memory/', memory_view, name='memory'),
 
 ]
 handler404 = 'core.views.page_not_found'